@@ -1,13 +1,15 @@
 """
 Demonstration script for agent-to-agent communication.
 """
+import asyncio
+
 from dotenv import load_dotenv
 from app.agents.a2a_communication import demonstrate_a2a_communication
 
 # Load environment variables
 load_dotenv()
 
-def main():
+async def main():
     """Run the agent-to-agent communication demonstration."""
     print("=== Agent-to-Agent Communication Demonstration ===")
     
@@ -32,7 +34,7 @@ def main():
         print("-" * 40)
         
         try:
-            result = demonstrate_a2a_communication(
+            result = await demonstrate_a2a_communication(
                 example["query"], 
                 example["context"]
             )
@@ -46,4 +48,4 @@ def main():
     print("\nA2A communication demonstration completed.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
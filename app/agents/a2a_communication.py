@@ -1,30 +1,68 @@
 """
 Simplified implementation of agent-to-agent communication.
 """
-from typing import Dict, Any, Optional
+import time
+from typing import Dict, Any, List, Optional
+
+from pydantic_ai.tools import Tool
+from pydantic_ai.usage import RunUsage
 
 from app.agents.heroku_agent import create_heroku_agent
+from app.agents.limits import AgentRunLimits, run_agent
+from app.agents.prompts import (
+    A2A_PATCH_SYSTEM_PROMPT,
+    A2A_REVIEWER_SYSTEM_PROMPT,
+    render_dynamic_prompt,
+)
+from app.agents.review_gate import ACCEPT, PATCH, ReviewGate, apply_patch, parse_patch, review_gate
+from app.tools.registry import tool_registry
 
-async def demonstrate_a2a_communication(query: str, context: Optional[str] = None) -> Dict[str, Any]:
+async def demonstrate_a2a_communication(
+    query: str,
+    context: Optional[str] = None,
+    usage: Optional[RunUsage] = None,
+    limits: Optional[AgentRunLimits] = None,
+    gate: Optional[ReviewGate] = None,
+    judge_usage: Optional[RunUsage] = None,
+    tools: Optional[List[Tool]] = None
+) -> Dict[str, Any]:
     """Demonstrate a simple agent-to-agent communication pattern.
     
     Args:
         query: The query to process
         context: Optional context for the query
+        usage: Optional usage object that accumulates token usage of all agent runs
+        limits: Optional limits applied to each of the agent runs
+        gate: Decides whether the response is returned, patched or fully reviewed,
+            defaults to review_gate
+        judge_usage: Optional usage object for the gate's judge run, which may use another
+            model than the agents; defaults to usage
+        tools: Tools offered to every agent of the exchange, so all of them see one
+            registry snapshot; defaults to the enabled tools of the current snapshot
         
     Returns:
         A dictionary with the results of the communication
     """
+    started = time.perf_counter()
+    if tools is None:
+        tools = await tool_registry.snapshot().load_tools()
+    
     # Create the first agent
-    first_agent = create_heroku_agent(name="primary_agent")
+    first_agent = create_heroku_agent(
+        name="primary_agent",
+        tools=tools,
+        use_registry_tools=False,
+        limits=limits
+    )
     
     # Process the query with the first agent
-    first_prompt = f"Please research the following topic: {query}"
-    if context:
-        first_prompt += f"\n\nContext: {context}"
+    first_prompt = render_dynamic_prompt([
+        ("Please research the following topic", query),
+        ("Context", context),
+    ])
     
     # Get response from first agent
-    result = await first_agent.run(first_prompt)
+    result = await run_agent(first_agent, first_prompt, limits, usage)
     
     # Extract the response string from the result
     if hasattr(result, 'output'):
@@ -32,20 +70,72 @@ async def demonstrate_a2a_communication(query: str, context: Optional[str] = Non
     else:
         first_response = str(result)
     
-    # Create a second agent with knowledge of the first response
-    second_agent = create_heroku_agent(name="secondary_agent")
+    # Score the first response to decide how much review it needs
+    gate = gate or review_gate
+    score = await gate.score(query, first_response, limits, usage if judge_usage is None else judge_usage)
+    decision = gate.decide(score)
+    agent_runs = 2 if gate.uses_judge else 1
     
-    # Have the second agent review and enhance the first agent's response
-    second_prompt = f"""You are reviewing another AI assistant's response about '{query}'. 
-    Please enhance this response by adding more details, correcting any errors, and making it more comprehensive.
+    if decision == ACCEPT:
+        final_response = first_response
+    elif decision == PATCH:
+        # Ask only for targeted edits, which costs far fewer output tokens than a rewrite
+        patch_agent = create_heroku_agent(
+            name="secondary_agent",
+            tools=tools,
+            use_registry_tools=False,
+            limits=limits,
+            system_prompt=A2A_PATCH_SYSTEM_PROMPT
+        )
+        patch_prompt = render_dynamic_prompt([
+            ("Topic", query),
+            ("Original response", first_response),
+        ])
+        result = await run_agent(patch_agent, patch_prompt, limits, usage)
+        agent_runs += 1
+        final_response, _ = apply_patch(first_response, parse_patch(str(result.output)))
+    else:
+        final_response = await _review(query, first_response, limits, usage, tools)
+        agent_runs += 1
     
-    Original response: 
-    {first_response}
+    gate.record(query, decision, score, first_response, final_response, started)
     
-    Your improved response:"""
+    return {
+        "query": query,
+        "context": context,
+        "response": final_response,
+        "review": {
+            "decision": decision,
+            "score": score,
+            "agent_runs": agent_runs
+        }
+    }
+
+async def _review(
+    query: str,
+    first_response: str,
+    limits: Optional[AgentRunLimits],
+    usage: Optional[RunUsage],
+    tools: List[Tool]
+) -> str:
+    # Create a second agent with knowledge of the first response
+    # The static review instructions form the system prompt so the prefix can be cached
+    second_agent = create_heroku_agent(
+        name="secondary_agent",
+        tools=tools,
+        use_registry_tools=False,
+        limits=limits,
+        system_prompt=A2A_REVIEWER_SYSTEM_PROMPT
+    )
+    
+    # Have the second agent review and enhance the first agent's response
+    second_prompt = render_dynamic_prompt([
+        ("Topic", query),
+        ("Original response", first_response),
+    ])
     
     # Get enhanced response from second agent
-    result = await second_agent.run(second_prompt)
+    result = await run_agent(second_agent, second_prompt, limits, usage)
     
     # Extract the response string from the result
     if hasattr(result, 'output'):
@@ -53,8 +143,4 @@ async def demonstrate_a2a_communication(query: str, context: Optional[str] = Non
     else:
         final_response = str(result)
     
-    return {
-        "query": query,
-        "context": context,
-        "response": final_response
-    }
\ No newline at end of file
+    return final_response
\ No newline at end of file
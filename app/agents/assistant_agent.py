@@ -5,7 +5,9 @@ from typing import List, Optional
 from pydantic_ai import Agent
 from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.providers.heroku import HerokuProvider
-from app.config import INFERENCE_API_KEY, MODEL_ID
+from app.agents.concurrency import limit_concurrency
+from app.agents.prompts import RESEARCH_ASSISTANT_SYSTEM_PROMPT, PromptCacheModel
+from app.config import INFERENCE_API_KEY, INFERENCE_URL, MODEL_ID
 
 class ResearchAssistantAgent:
     """A research assistant agent that can communicate with our main agent."""
@@ -23,33 +25,22 @@ class ResearchAssistantAgent:
         if not self.api_key:
             raise ValueError("INFERENCE_API_KEY must be provided")
         
-        # Create the OpenAI model with Heroku provider
-        self.model = OpenAIModel(
+        # Create the OpenAI model with Heroku provider behind the shared adaptive limiter
+        self.model = PromptCacheModel(limit_concurrency(OpenAIModel(
             MODEL_ID,
-            provider=HerokuProvider(api_key=self.api_key),
-        )
+            provider=HerokuProvider(api_key=self.api_key, base_url=INFERENCE_URL),
+        )))
         
-        # Create the agent
+        # Create the agent with its static system instructions
         self.agent = Agent(
             model=self.model,
+            system_prompt=self._system_instructions(),
         )
-        
-        # Set system instructions
-        self._set_system_instructions()
     
-    def _set_system_instructions(self):
-        """Set the system instructions for the research assistant agent."""
-        system_prompt = """
-        You are a research assistant agent that helps the main agent with research tasks.
-        When asked to research a topic:
-        1. Consider what's likely already known about the topic
-        2. Focus on filling knowledge gaps or providing deeper context
-        3. Structure your response with clear sections and bullet points for readability
-        4. Include key facts, figures, and definitions relevant to the topic
-        5. If the query is ambiguous, clarify what specific aspect you're addressing
+    def _system_instructions(self) -> str:
+        """Get the system instructions for the research assistant agent.
         
-        Your response should be comprehensive yet concise, focusing on quality information
-        rather than excessive detail. Always maintain a professional, informative tone.
+        The instructions are a module-level constant so that the prompt prefix
+        is byte-identical across requests and can be cached upstream.
         """
-        
-        self.agent.system_prompt = system_prompt
\ No newline at end of file
+        return RESEARCH_ASSISTANT_SYSTEM_PROMPT
\ No newline at end of file
@@ -0,0 +1,319 @@
+"""
+Adaptive concurrency limit for model calls to Heroku Inference.
+
+The limiter estimates the no-load round-trip time as the minimum over a
+sliding window of recent samples and compares recent calls against it.
+Model call latency grows with the length of the output, so calls are grouped
+by output tokens into power-of-two size classes, each with its own no-load
+RTT; a short tool-call turn is compared with other short turns, not with a
+long answer. While the smoothed ratio of RTT to no-load RTT stays within the
+tolerance the limit grows; once the upstream starts queueing and the ratio
+rises above it, the limit shrinks by that gradient (a gradient algorithm, as
+in Netflix's concurrency-limits). Failed calls shrink the limit
+multiplicatively. Calls above the limit wait in a local FIFO queue with a
+deadline.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from pydantic_ai.messages import ModelMessage, ModelResponse
+from pydantic_ai.models import ModelRequestParameters, StreamedResponse
+from pydantic_ai.models.wrapper import WrapperModel
+
+from app.config import (
+    INFERENCE_ADAPTIVE_CONCURRENCY,
+    INFERENCE_CONCURRENCY_INITIAL,
+    INFERENCE_CONCURRENCY_MIN,
+    INFERENCE_CONCURRENCY_MAX,
+    INFERENCE_RTT_TOLERANCE,
+    INFERENCE_RTT_WINDOW,
+    INFERENCE_QUEUE_TIMEOUT_SECONDS,
+    INFERENCE_MAX_QUEUE,
+)
+
+class ConcurrencyLimitExceeded(Exception):
+    """Raised when a model call cannot get a slot: the queue is full or its deadline passed."""
+
+@dataclass
+class CallSample:
+    """What a call reports about itself once it holds a slot."""
+    output_tokens: Optional[int] = None
+
+def size_class(output_tokens: Optional[int]) -> int:
+    """Group calls of similar output length: 0 for unknown, else the power of two of the token count.
+
+    Args:
+        output_tokens: The number of output tokens of the call, if known
+
+    Returns:
+        The size class
+    """
+    return int(output_tokens).bit_length() if output_tokens else 0
+
+class AdaptiveConcurrencyLimiter:
+    """Adjusts the number of in-flight model calls from observed round-trip times."""
+
+    def __init__(
+        self,
+        initial_limit: int = INFERENCE_CONCURRENCY_INITIAL,
+        min_limit: int = INFERENCE_CONCURRENCY_MIN,
+        max_limit: int = INFERENCE_CONCURRENCY_MAX,
+        tolerance: float = INFERENCE_RTT_TOLERANCE,
+        rtt_window: int = INFERENCE_RTT_WINDOW,
+        queue_timeout: float = INFERENCE_QUEUE_TIMEOUT_SECONDS,
+        max_queue: int = INFERENCE_MAX_QUEUE,
+        smoothing: float = 0.2,
+        backoff_ratio: float = 0.9,
+    ):
+        """Initialize the limiter.
+
+        Args:
+            initial_limit: The starting number of concurrent calls
+            min_limit: The limit never drops below this
+            max_limit: The limit never grows above this
+            tolerance: How much slower than the no-load RTT a call may be before the limit shrinks
+            rtt_window: Number of recent samples of a size class its no-load RTT is the minimum of
+            queue_timeout: Seconds a call may wait for a slot
+            max_queue: Maximum number of waiting calls; further calls are rejected
+            smoothing: Weight of each new limit estimate, between 0 and 1
+            backoff_ratio: Factor the limit is multiplied by when a call fails
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.rtt_window = rtt_window
+        self.queue_timeout = queue_timeout
+        self.max_queue = max_queue
+        self.smoothing = smoothing
+        self.backoff_ratio = backoff_ratio
+        self.limit = float(min(max(initial_limit, min_limit), max_limit))
+
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Per size class, a monotonic deque of (sample number, rtt) for the sliding window minimum
+        self._windows: Dict[int, Deque[Tuple[int, float]]] = {}
+        self._samples: Dict[int, int] = {}
+        # Smoothed ratio of recent RTTs to the no-load RTT of their size class
+        self._latency_ratio: Optional[float] = None
+        self._counters = {"calls": 0, "queued": 0, "rejected": 0, "timeouts": 0, "errors": 0}
+
+    @property
+    def in_flight(self) -> int:
+        """Number of calls currently holding a slot."""
+        return self._in_flight
+
+    @property
+    def queue_length(self) -> int:
+        """Number of calls waiting for a slot."""
+        return len(self._waiters)
+
+    @property
+    def noload_rtt(self) -> Optional[float]:
+        """The estimated no-load round-trip time in seconds of the fastest size class."""
+        return min((window[0][1] for window in self._windows.values()), default=None)
+
+    def _has_capacity(self) -> bool:
+        return self._in_flight < max(self.min_limit, int(self.limit))
+
+    async def acquire(self, timeout: Optional[float] = None) -> None:
+        """Wait for a slot.
+
+        Args:
+            timeout: Seconds to wait in the queue, defaults to queue_timeout
+
+        Raises:
+            ConcurrencyLimitExceeded: If the queue is full or the deadline passes
+        """
+        self._counters["calls"] += 1
+        if not self._waiters and self._has_capacity():
+            self._in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._counters["rejected"] += 1
+            raise ConcurrencyLimitExceeded(
+                f"Inference queue is full ({self.max_queue} waiting calls)"
+            )
+
+        timeout = self.queue_timeout if timeout is None else timeout
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._counters["queued"] += 1
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self._counters["timeouts"] += 1
+            raise ConcurrencyLimitExceeded(
+                f"No inference slot became free within {timeout}s"
+            ) from None
+        except asyncio.CancelledError:
+            # The slot may have been granted just before the caller was cancelled
+            if waiter.done() and not waiter.cancelled():
+                self._release_slot()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(
+        self,
+        rtt: Optional[float] = None,
+        in_flight: int = 0,
+        error: bool = False,
+        output_tokens: Optional[int] = None
+    ) -> None:
+        """Give a slot back and update the limit.
+
+        Args:
+            rtt: Round-trip time of the call in seconds, None when it did not complete
+            in_flight: Number of in-flight calls when the call started
+            error: Whether the call failed upstream
+            output_tokens: Number of output tokens of the call, if known
+        """
+        if error:
+            self._counters["errors"] += 1
+            self.limit = max(float(self.min_limit), self.limit * self.backoff_ratio)
+        elif rtt is not None:
+            self._record_rtt(rtt, in_flight, size_class(output_tokens))
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        self._in_flight -= 1
+        # Hand free slots to waiters in arrival order
+        while self._waiters and self._has_capacity():
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._in_flight += 1
+            waiter.set_result(None)
+
+    def _record_rtt(self, rtt: float, in_flight: int, size: int) -> None:
+        window = self._windows.setdefault(size, deque())
+        sample = self._samples[size] = self._samples.get(size, 0) + 1
+        while window and window[-1][1] >= rtt:
+            window.pop()
+        window.append((sample, rtt))
+        while window[0][0] <= sample - self.rtt_window:
+            window.popleft()
+
+        ratio = rtt / window[0][1] if window[0][1] > 0 else 1.0
+        if self._latency_ratio is None:
+            self._latency_ratio = ratio
+        else:
+            self._latency_ratio += 0.2 * (ratio - self._latency_ratio)
+
+        # Calls far below the limit say nothing about it, whatever their latency
+        if in_flight < self.limit / 2:
+            return
+        gradient = max(0.5, min(1.0, self.tolerance / self._latency_ratio))
+        # sqrt(limit) of headroom lets the limit probe upwards while latency stays flat
+        estimate = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit * (1 - self.smoothing) + estimate * self.smoothing
+        self.limit = min(float(self.max_limit), max(float(self.min_limit), limit))
+
+    @asynccontextmanager
+    async def slot(self, timeout: Optional[float] = None) -> AsyncIterator[CallSample]:
+        """Hold a slot for the duration of a model call and record its outcome.
+
+        The caller may set the output tokens on the yielded sample, so the call's
+        RTT is compared with calls of a similar length.
+
+        Args:
+            timeout: Seconds to wait in the queue, defaults to queue_timeout
+
+        Raises:
+            ConcurrencyLimitExceeded: If no slot could be acquired
+        """
+        await self.acquire(timeout)
+        in_flight = self._in_flight
+        sample = CallSample()
+        start = time.perf_counter()
+        try:
+            yield sample
+        except asyncio.CancelledError:
+            # The caller gave up; that says nothing about the upstream
+            self.release()
+            raise
+        except Exception:
+            self.release(error=True)
+            raise
+        else:
+            self.release(time.perf_counter() - start, in_flight, output_tokens=sample.output_tokens)
+
+    def report(self) -> Dict[str, Any]:
+        """Build a report of the current limit, queue and RTT estimates.
+
+        Returns:
+            A dictionary with the limit, in-flight and queued calls, the no-load RTT in
+            milliseconds, the recent latency relative to it and counters
+        """
+        noload = self.noload_rtt
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self._in_flight,
+            "queue_length": len(self._waiters),
+            "noload_rtt_ms": round(noload * 1000, 1) if noload is not None else None,
+            "latency_ratio": round(self._latency_ratio, 2) if self._latency_ratio is not None else None,
+            **self._counters,
+        }
+
+# Create a global inference concurrency limiter instance
+inference_limiter = AdaptiveConcurrencyLimiter()
+
+class AdaptiveConcurrencyModel(WrapperModel):
+    """Model wrapper that runs every request through an adaptive concurrency limiter."""
+
+    def __init__(self, wrapped: Any, limiter: Optional[AdaptiveConcurrencyLimiter] = None):
+        """Initialize the wrapper.
+
+        Args:
+            wrapped: The model to wrap
+            limiter: The limiter to use, defaults to inference_limiter
+        """
+        super().__init__(wrapped)
+        self.limiter = limiter or inference_limiter
+
+    async def request(
+        self,
+        messages: List[ModelMessage],
+        model_settings: Any,
+        model_request_parameters: ModelRequestParameters
+    ) -> ModelResponse:
+        async with self.limiter.slot() as sample:
+            response = await self.wrapped.request(messages, model_settings, model_request_parameters)
+            sample.output_tokens = response.usage.output_tokens
+            return response
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: List[ModelMessage],
+        model_settings: Any,
+        model_request_parameters: ModelRequestParameters,
+        run_context: Any = None
+    ) -> AsyncIterator[StreamedResponse]:
+        # The slot is held until the stream is fully consumed
+        async with self.limiter.slot() as sample:
+            async with self.wrapped.request_stream(
+                messages, model_settings, model_request_parameters, run_context
+            ) as response_stream:
+                yield response_stream
+                sample.output_tokens = response_stream.usage().output_tokens
+
+def limit_concurrency(model: Any) -> Any:
+    """Wrap a model in the shared adaptive limiter unless it is turned off.
+
+    Args:
+        model: The model to wrap
+
+    Returns:
+        The wrapped model, or the model itself when INFERENCE_ADAPTIVE_CONCURRENCY is false
+    """
+    if not INFERENCE_ADAPTIVE_CONCURRENCY:
+        return model
+    return AdaptiveConcurrencyModel(model)
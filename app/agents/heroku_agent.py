@@ -7,15 +7,23 @@ from typing import List, Dict, Any, Optional
 from pydantic_ai import Agent
 from pydantic_ai.models.openai import OpenAIModel
 from pydantic_ai.providers.heroku import HerokuProvider
+from pydantic_ai.settings import ModelSettings
 from pydantic_ai.tools import Tool
 
-from app.config import INFERENCE_API_KEY, MODEL_ID, DEFAULT_AGENT_NAME
+from app.agents.concurrency import limit_concurrency
+from app.agents.limits import AgentRunLimits, ToolConcurrencyLimiter
+from app.agents.prompts import HEROKU_AGENT_SYSTEM_PROMPT, PromptCacheModel, ordered_tools
+from app.config import INFERENCE_API_KEY, INFERENCE_URL, MODEL_ID, DEFAULT_AGENT_NAME
 from app.tools.registry import tool_registry
 
 def create_heroku_agent(
     name: str = DEFAULT_AGENT_NAME,
     tools: Optional[List[Tool]] = None,
-    use_registry_tools: bool = True
+    use_registry_tools: bool = True,
+    limits: Optional[AgentRunLimits] = None,
+    system_prompt: str = HEROKU_AGENT_SYSTEM_PROMPT,
+    model_id: str = MODEL_ID,
+    model_settings: Optional[ModelSettings] = None
 ) -> Agent:
     """Create a new Pydantic AI agent powered by Heroku Inference.
     
@@ -23,6 +31,10 @@ def create_heroku_agent(
         name: The name of the agent
         tools: Optional list of additional tools for the agent
         use_registry_tools: Whether to include tools from the tool registry
+        limits: Optional run limits; caps how many tool calls run concurrently
+        system_prompt: Static system prompt; keep dynamic content in the user prompt
+        model_id: The Heroku Inference model to use
+        model_settings: Optional model settings such as a max_tokens cap
         
     Returns:
         An initialized Pydantic AI Agent
@@ -31,11 +43,12 @@ def create_heroku_agent(
     if not INFERENCE_API_KEY:
         raise ValueError("INFERENCE_API_KEY must be provided")
     
-    # Create the Heroku OpenAI model
-    model = OpenAIModel(
-        MODEL_ID,
-        provider=HerokuProvider(api_key=INFERENCE_API_KEY),
-    )
+    # Create the Heroku OpenAI model, recording prompt cache hits per prefix
+    # and adapting how many calls are in flight to the upstream's latency
+    model = PromptCacheModel(limit_concurrency(OpenAIModel(
+        model_id,
+        provider=HerokuProvider(api_key=INFERENCE_API_KEY, base_url=INFERENCE_URL),
+    )))
     
     # Collect all tools
     all_tools = []
@@ -48,11 +61,19 @@ def create_heroku_agent(
     if tools:
         all_tools.extend(tools)
     
+    # Keep tool schemas in a stable order so the prompt prefix stays cacheable
+    all_tools = ordered_tools(all_tools)
+    
+    # Bound how many tool calls of a single turn execute at once
+    if limits:
+        all_tools = ToolConcurrencyLimiter(limits.max_tool_concurrency).wrap_all(all_tools)
+    
     # Create and configure the agent
     agent = Agent(
         model=model,
         tools=all_tools,
-        system_prompt="You are a helpful AI assistant with access to tools. When asked a question, think through the problem step by step and use the appropriate tools to find and provide accurate information."
+        system_prompt=system_prompt,
+        model_settings=model_settings
     )
     
     return agent
\ No newline at end of file
@@ -0,0 +1,160 @@
+"""
+Per-route limits for agent runs: tool concurrency, round trips, wall time and tokens.
+"""
+import asyncio
+import dataclasses
+import functools
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from pydantic_ai import Agent
+from pydantic_ai.exceptions import UsageLimitExceeded
+from pydantic_ai.tools import Tool
+from pydantic_ai.usage import RunUsage, UsageLimits
+
+from app.config import ROUTE_RUN_LIMITS
+
+class AgentRunLimitExceeded(Exception):
+    """Raised when an agent run exceeds its round-trip or token limits."""
+
+class AgentRunTimeout(AgentRunLimitExceeded):
+    """Raised when an agent run exceeds its wall time limit."""
+
+@dataclass(frozen=True)
+class AgentRunLimits:
+    """Hard limits applied to a single agent run."""
+    max_tool_concurrency: int = 4
+    max_tool_round_trips: int = 5
+    max_wall_time: float = 60.0
+    max_total_tokens: int = 0
+
+    def usage_limits(self) -> UsageLimits:
+        """Translate the limits into Pydantic AI usage limits.
+
+        Returns:
+            Usage limits allowing one model request plus one per tool round trip
+        """
+        return UsageLimits(
+            request_limit=self.max_tool_round_trips + 1,
+            total_tokens_limit=self.max_total_tokens or None,
+        )
+
+DEFAULT_RUN_LIMITS = AgentRunLimits()
+
+def get_route_limits(route: str) -> AgentRunLimits:
+    """Get the configured run limits for an API route.
+
+    Args:
+        route: The route name, e.g. "query" or "a2a"
+
+    Returns:
+        The route's limits, or the defaults for unknown routes
+    """
+    settings = ROUTE_RUN_LIMITS.get(route)
+    if settings is None:
+        return DEFAULT_RUN_LIMITS
+    return AgentRunLimits(**settings)
+
+class ToolConcurrencyLimiter:
+    """Caps how many tool calls of one agent run execute at the same time.
+
+    Pydantic AI already starts every tool call of a model turn as its own task;
+    this limiter bounds how many of them actually run concurrently. Synchronous
+    tool functions are moved to worker threads so they never block the event loop.
+    """
+
+    def __init__(self, max_concurrency: int):
+        """Initialize the limiter.
+
+        Args:
+            max_concurrency: Maximum number of concurrently executing tool calls
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        # Created lazily so the semaphore binds to the loop that runs the agent
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    def wrap(self, tool: Tool) -> Tool:
+        """Wrap a tool so that its calls go through the limiter.
+
+        Args:
+            tool: The tool to wrap
+
+        Returns:
+            A new tool with the same name, description and schema
+        """
+        schema = tool.function_schema
+        function = schema.function
+        is_async = schema.is_async
+
+        @functools.wraps(function)
+        async def limited(*args: Any, **kwargs: Any) -> Any:
+            async with self.semaphore:
+                if is_async:
+                    return await function(*args, **kwargs)
+                return await asyncio.to_thread(function, *args, **kwargs)
+
+        return Tool(
+            limited,
+            name=tool.name,
+            description=tool.description,
+            max_retries=tool.max_retries,
+            prepare=tool.prepare,
+            strict=tool.strict,
+            function_schema=dataclasses.replace(schema, function=limited, is_async=True),
+        )
+
+    def wrap_all(self, tools: List[Tool]) -> List[Tool]:
+        """Wrap a list of tools.
+
+        Args:
+            tools: The tools to wrap
+
+        Returns:
+            The wrapped tools, in the same order
+        """
+        return [self.wrap(tool) for tool in tools]
+
+async def run_agent(
+    agent: Agent,
+    prompt: str,
+    limits: Optional[AgentRunLimits] = None,
+    usage: Optional[RunUsage] = None
+) -> Any:
+    """Run an agent while enforcing round-trip, token and wall time limits.
+
+    Args:
+        agent: The agent to run
+        prompt: The user prompt
+        limits: The limits to enforce, defaults to DEFAULT_RUN_LIMITS
+        usage: Optional usage object the run's usage is added to, even on failure
+
+    Returns:
+        The agent run result
+
+    Raises:
+        AgentRunTimeout: If the run exceeds its wall time
+        AgentRunLimitExceeded: If the run exceeds its round-trip or token limits
+    """
+    limits = limits or DEFAULT_RUN_LIMITS
+    # Limits apply per run, so count this run separately from any shared usage
+    run_usage = RunUsage()
+    try:
+        return await asyncio.wait_for(
+            agent.run(prompt, usage=run_usage, usage_limits=limits.usage_limits()),
+            timeout=limits.max_wall_time,
+        )
+    except asyncio.TimeoutError:
+        raise AgentRunTimeout(
+            f"Agent run exceeded the wall time limit of {limits.max_wall_time}s"
+        ) from None
+    except UsageLimitExceeded as e:
+        raise AgentRunLimitExceeded(f"Agent run stopped: {e}") from e
+    finally:
+        if usage is not None:
+            usage.incr(run_usage)
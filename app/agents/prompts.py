@@ -0,0 +1,238 @@
+"""
+Prompt assembly with stable prefixes for upstream prompt caching.
+
+Providers cache prompts by prefix, so every request is laid out as static
+system prompt, then tool schemas, then dynamic content. The static parts live
+here as constants and tools are ordered by name, which keeps the prefix
+byte-identical across requests.
+"""
+import hashlib
+import inspect
+import json
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pydantic_ai.messages import ModelMessage, ModelRequest, ModelResponse, SystemPromptPart
+from pydantic_ai.models import ModelRequestParameters, StreamedResponse
+from pydantic_ai.models.wrapper import WrapperModel
+from pydantic_ai.tools import Tool, ToolDefinition
+from pydantic_ai.usage import RequestUsage
+
+HEROKU_AGENT_SYSTEM_PROMPT = (
+    "You are a helpful AI assistant with access to tools. When asked a question, "
+    "think through the problem step by step and use the appropriate tools to find "
+    "and provide accurate information."
+)
+
+RESEARCH_ASSISTANT_SYSTEM_PROMPT = inspect.cleandoc("""
+    You are a research assistant agent that helps the main agent with research tasks.
+    When asked to research a topic:
+    1. Consider what's likely already known about the topic
+    2. Focus on filling knowledge gaps or providing deeper context
+    3. Structure your response with clear sections and bullet points for readability
+    4. Include key facts, figures, and definitions relevant to the topic
+    5. If the query is ambiguous, clarify what specific aspect you're addressing
+
+    Your response should be comprehensive yet concise, focusing on quality information
+    rather than excessive detail. Always maintain a professional, informative tone.
+""")
+
+A2A_REVIEWER_SYSTEM_PROMPT = inspect.cleandoc("""
+    You are reviewing another AI assistant's response to a research topic.
+    Please enhance the response by adding more details, correcting any errors,
+    and making it more comprehensive.
+
+    The user message contains the topic and the original response.
+    Reply with your improved response only.
+""")
+
+A2A_PATCH_SYSTEM_PROMPT = inspect.cleandoc("""
+    You are reviewing another AI assistant's response to a research topic.
+    The response is mostly adequate; only fix errors and fill clear gaps.
+    Do not rewrite it. Reply only with edit blocks in this exact format:
+
+    <<<<<<< SEARCH
+    exact text copied from the original response
+    =======
+    replacement text
+    >>>>>>> REPLACE
+
+    Leave SEARCH empty to append text at the end.
+    Reply with NO CHANGES if nothing needs fixing.
+""")
+
+A2A_JUDGE_SYSTEM_PROMPT = inspect.cleandoc("""
+    You grade an AI assistant's response to a research topic for accuracy,
+    completeness and clarity. The user message contains the topic and the response.
+    Reply with a single integer from 0 (unusable) to 10 (nothing to improve) and nothing else.
+""")
+
+def ordered_tools(tools: Sequence[Tool]) -> List[Tool]:
+    """Order tools by name so their schemas are sent in a stable order.
+
+    Args:
+        tools: The tools to order
+
+    Returns:
+        The tools sorted by name
+    """
+    return sorted(tools, key=lambda tool: tool.name)
+
+def render_dynamic_prompt(sections: Sequence[Tuple[str, Optional[str]]]) -> str:
+    """Render the dynamic part of a prompt as labelled sections.
+
+    Args:
+        sections: (label, content) pairs in order; empty contents are skipped
+
+    Returns:
+        The rendered user prompt
+    """
+    return "\n\n".join(f"{label}:\n{content}" for label, content in sections if content)
+
+def prefix_fingerprint(system_prompts: Sequence[str], tool_defs: Sequence[ToolDefinition]) -> str:
+    """Fingerprint the static prefix of a model request.
+
+    Args:
+        system_prompts: The system prompt parts of the request
+        tool_defs: The tool definitions sent with the request
+
+    Returns:
+        A short hex digest of the system prompts and tool schemas
+    """
+    digest = hashlib.sha256()
+    for prompt in system_prompts:
+        digest.update(prompt.encode("utf-8"))
+        digest.update(b"\0")
+    for tool_def in tool_defs:
+        digest.update(json.dumps(
+            [tool_def.name, tool_def.description, tool_def.parameters_json_schema],
+            sort_keys=True,
+            separators=(",", ":"),
+        ).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+@dataclass
+class PrefixStats:
+    """Cache statistics for requests sharing one prompt prefix."""
+    requests: int = 0
+    input_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the statistics to a JSON-friendly dictionary."""
+        return {
+            "requests": self.requests,
+            "input_tokens": self.input_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_write_tokens": self.cache_write_tokens,
+            "hit_fraction": _hit_fraction(self.input_tokens, self.cache_read_tokens),
+        }
+
+def _hit_fraction(input_tokens: int, cache_read_tokens: int) -> Optional[float]:
+    # Only meaningful once the upstream reports cached tokens at all
+    if not input_tokens or not cache_read_tokens:
+        return None
+    return round(cache_read_tokens / input_tokens, 4)
+
+class PromptCacheStats:
+    """Tracks how much of each prompt prefix was served from the upstream cache."""
+
+    def __init__(self):
+        """Initialize the statistics."""
+        self._prefixes: Dict[str, PrefixStats] = {}
+
+    def record(self, fingerprint: str, usage: RequestUsage) -> None:
+        """Record the usage of one model request.
+
+        Args:
+            fingerprint: The prefix fingerprint of the request
+            usage: The usage reported for the request
+        """
+        stats = self._prefixes.get(fingerprint)
+        if stats is None:
+            stats = self._prefixes[fingerprint] = PrefixStats()
+        stats.requests += 1
+        stats.input_tokens += usage.input_tokens
+        stats.cache_read_tokens += usage.cache_read_tokens
+        stats.cache_write_tokens += usage.cache_write_tokens
+
+    def report(self) -> Dict[str, Any]:
+        """Build a report of cache hits per prefix and overall.
+
+        Returns:
+            A dictionary with the overall hit fraction and per-prefix statistics
+        """
+        input_tokens = sum(stats.input_tokens for stats in self._prefixes.values())
+        cache_read_tokens = sum(stats.cache_read_tokens for stats in self._prefixes.values())
+        return {
+            "hit_fraction": _hit_fraction(input_tokens, cache_read_tokens),
+            "prefixes": {fingerprint: stats.to_dict() for fingerprint, stats in self._prefixes.items()},
+        }
+
+# Create a global prompt cache statistics instance
+prompt_cache_stats = PromptCacheStats()
+
+class PromptCacheModel(WrapperModel):
+    """Model wrapper that fingerprints request prefixes and records cache hits."""
+
+    def __init__(self, wrapped: Any, stats: Optional[PromptCacheStats] = None):
+        """Initialize the wrapper.
+
+        Args:
+            wrapped: The model to wrap
+            stats: Where to record statistics, defaults to prompt_cache_stats
+        """
+        super().__init__(wrapped)
+        self.stats = stats or prompt_cache_stats
+
+    @staticmethod
+    def fingerprint(
+        messages: List[ModelMessage],
+        model_request_parameters: ModelRequestParameters
+    ) -> str:
+        """Fingerprint the static prefix of a request.
+
+        Args:
+            messages: The messages of the request
+            model_request_parameters: The tool and output parameters of the request
+
+        Returns:
+            The prefix fingerprint
+        """
+        system_prompts = [
+            part.content
+            for message in messages
+            if isinstance(message, ModelRequest)
+            for part in message.parts
+            if isinstance(part, SystemPromptPart)
+        ]
+        tool_defs = [*model_request_parameters.function_tools, *model_request_parameters.output_tools]
+        return prefix_fingerprint(system_prompts, tool_defs)
+
+    async def request(
+        self,
+        messages: List[ModelMessage],
+        model_settings: Any,
+        model_request_parameters: ModelRequestParameters
+    ) -> ModelResponse:
+        response = await self.wrapped.request(messages, model_settings, model_request_parameters)
+        self.stats.record(self.fingerprint(messages, model_request_parameters), response.usage)
+        return response
+
+    @asynccontextmanager
+    async def request_stream(
+        self,
+        messages: List[ModelMessage],
+        model_settings: Any,
+        model_request_parameters: ModelRequestParameters,
+        run_context: Any = None
+    ) -> AsyncIterator[StreamedResponse]:
+        async with self.wrapped.request_stream(
+            messages, model_settings, model_request_parameters, run_context
+        ) as response_stream:
+            yield response_stream
+        self.stats.record(self.fingerprint(messages, model_request_parameters), response_stream.usage())
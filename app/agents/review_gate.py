@@ -0,0 +1,325 @@
+"""
+Gate between the two stages of agent-to-agent communication.
+
+The first agent's response is scored before the reviewer runs. A high score
+returns the response as is, a middling score asks the reviewer only for
+targeted edits, and a low score runs the full review. Scores come from a
+cheap local heuristic or from a small judge model capped to a few tokens.
+"""
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic_ai.usage import RunUsage
+
+from app.agents.heroku_agent import create_heroku_agent
+from app.agents.limits import AgentRunLimits, run_agent
+from app.agents.prompts import A2A_JUDGE_SYSTEM_PROMPT, render_dynamic_prompt
+from app.config import (
+    A2A_REVIEW_GATE,
+    A2A_GATE_ACCEPT_THRESHOLD,
+    A2A_GATE_PATCH_THRESHOLD,
+    A2A_GATE_MIN_WORDS,
+    A2A_JUDGE_MODEL_ID,
+    A2A_JUDGE_MAX_TOKENS,
+)
+
+# Gate decisions
+ACCEPT = "accept"
+PATCH = "patch"
+REVIEW = "review"
+DECISIONS = (ACCEPT, PATCH, REVIEW)
+
+GATE_MODES = ("off", "heuristic", "judge")
+
+_STOPWORDS = {
+    "about", "does", "from", "have", "into", "that", "their", "there", "these",
+    "this", "what", "when", "where", "which", "with", "would", "your",
+}
+
+_HEDGES = (
+    "i'm not sure", "i am not sure", "i don't know", "i do not know",
+    "i cannot", "i can't", "unable to", "as an ai",
+)
+
+_PATCH_BLOCK = re.compile(
+    r"<<<<<<< SEARCH\n(.*?)\n?=======\n(.*?)\n?>>>>>>> REPLACE",
+    re.DOTALL,
+)
+
+def score_response(query: str, response: str, min_words: int = A2A_GATE_MIN_WORDS) -> float:
+    """Score a response locally from cheap surface features.
+
+    The score combines length, coverage of the query's terms, structure and
+    whether the response ends cleanly, and is halved for hedging or refusals.
+
+    Args:
+        query: The query the response answers
+        response: The response to score
+        min_words: Word count at which a response counts as long enough
+
+    Returns:
+        A score between 0 and 1
+    """
+    text = response.strip()
+    if not text:
+        return 0.0
+    lower = text.lower()
+
+    length = min(1.0, len(text.split()) / max(1, min_words))
+
+    terms = {
+        term for term in re.findall(r"[a-z0-9]+", query.lower())
+        if len(term) > 3 and term not in _STOPWORDS
+    }
+    coverage = sum(term in lower for term in terms) / len(terms) if terms else 1.0
+
+    lines = text.splitlines()
+    structured = (
+        "\n\n" in text
+        or any(line.lstrip().startswith(("-", "*", "#", "1.")) for line in lines)
+    )
+    structure = 1.0 if structured else 0.5
+
+    # A response cut off by a token limit rarely ends with punctuation
+    complete = 1.0 if text[-1] in ".!?)\"'`*|" else 0.6
+
+    score = 0.35 * length + 0.35 * coverage + 0.15 * structure + 0.15 * complete
+    if any(hedge in lower for hedge in _HEDGES):
+        score *= 0.5
+    return round(score, 4)
+
+def parse_judge_score(text: str) -> Optional[float]:
+    """Parse the judge model's 0-10 grade.
+
+    Args:
+        text: The judge's reply
+
+    Returns:
+        The grade scaled to 0-1, or None when the reply holds no grade
+    """
+    match = re.search(r"\d+(?:\.\d+)?", text)
+    if match is None:
+        return None
+    return min(10.0, float(match.group())) / 10
+
+def parse_patch(text: str) -> List[Tuple[str, str]]:
+    """Parse the reviewer's edit blocks.
+
+    Args:
+        text: The reviewer's reply
+
+    Returns:
+        (search, replace) pairs; an empty search appends the replacement
+    """
+    return [(search, replace) for search, replace in _PATCH_BLOCK.findall(text)]
+
+def apply_patch(response: str, edits: List[Tuple[str, str]]) -> Tuple[str, int]:
+    """Apply edit blocks to a response.
+
+    Edits whose search text is not found are skipped.
+
+    Args:
+        response: The response to edit
+        edits: (search, replace) pairs from parse_patch
+
+    Returns:
+        The edited response and the number of edits applied
+    """
+    applied = 0
+    for search, replace in edits:
+        if not search:
+            response = f"{response.rstrip()}\n\n{replace}"
+        elif search in response:
+            response = response.replace(search, replace, 1)
+        else:
+            continue
+        applied += 1
+    return response, applied
+
+class ReviewGateStats:
+    """Tracks gate decisions, latency and the quality delta of reviews.
+
+    Quality is always measured with the local heuristic, whatever the gate
+    mode, so that deltas stay comparable. Scores are bucketed by tenths: the
+    mean delta of reviewed responses in each bucket shows where the reviewer
+    stops paying for itself, which is where the accept threshold belongs.
+    """
+
+    def __init__(self):
+        """Initialize the statistics."""
+        self._decisions: Dict[str, Dict[str, float]] = {
+            decision: {"count": 0, "score": 0.0, "delta": 0.0, "latency_ms": 0.0}
+            for decision in DECISIONS
+        }
+        self._buckets: Dict[str, Dict[str, float]] = {}
+
+    def record(self, decision: str, score: float, quality_delta: float, latency_ms: float) -> None:
+        """Record one gated A2A exchange.
+
+        Args:
+            decision: The gate decision
+            score: The gate score of the first response
+            quality_delta: Heuristic score of the final response minus that of the first
+            latency_ms: Latency of the whole exchange
+        """
+        stats = self._decisions[decision]
+        stats["count"] += 1
+        stats["score"] += score
+        stats["delta"] += quality_delta
+        stats["latency_ms"] += latency_ms
+
+        low = min(9, int(score * 10)) / 10
+        bucket = self._buckets.setdefault(
+            f"{low:.1f}-{low + 0.1:.1f}", {"count": 0, "reviewed": 0, "delta": 0.0}
+        )
+        bucket["count"] += 1
+        if decision != ACCEPT:
+            bucket["reviewed"] += 1
+            bucket["delta"] += quality_delta
+
+    def report(self) -> Dict[str, Any]:
+        """Build a report of skip rates, quality deltas and latency per decision.
+
+        Returns:
+            A dictionary with overall rates, per-decision means and score buckets
+        """
+        total = sum(stats["count"] for stats in self._decisions.values())
+        decisions = {}
+        for decision, stats in self._decisions.items():
+            count = stats["count"]
+            decisions[decision] = {
+                "count": count,
+                "mean_score": round(stats["score"] / count, 4) if count else None,
+                "mean_quality_delta": round(stats["delta"] / count, 4) if count else None,
+                "mean_latency_ms": round(stats["latency_ms"] / count, 1) if count else None,
+            }
+        buckets = {
+            name: {
+                "count": bucket["count"],
+                "reviewed": bucket["reviewed"],
+                "mean_quality_delta": (
+                    round(bucket["delta"] / bucket["reviewed"], 4) if bucket["reviewed"] else None
+                ),
+            }
+            for name, bucket in sorted(self._buckets.items())
+        }
+        return {
+            "total": total,
+            "skip_rate": round(self._decisions[ACCEPT]["count"] / total, 4) if total else None,
+            "patch_rate": round(self._decisions[PATCH]["count"] / total, 4) if total else None,
+            "decisions": decisions,
+            "score_buckets": buckets,
+        }
+
+class ReviewGate:
+    """Decides how much review the first agent's response gets."""
+
+    def __init__(
+        self,
+        mode: str = A2A_REVIEW_GATE,
+        accept_threshold: float = A2A_GATE_ACCEPT_THRESHOLD,
+        patch_threshold: float = A2A_GATE_PATCH_THRESHOLD,
+        judge_model_id: str = A2A_JUDGE_MODEL_ID,
+        judge_max_tokens: int = A2A_JUDGE_MAX_TOKENS,
+        stats: Optional[ReviewGateStats] = None,
+    ):
+        """Initialize the gate.
+
+        Args:
+            mode: "off" always reviews, "heuristic" scores locally, "judge" asks a small model
+            accept_threshold: Scores at or above this return the first response
+            patch_threshold: Scores at or above this (and below accept) request edits only
+            judge_model_id: The model used in judge mode
+            judge_max_tokens: Output token cap of the judge call
+            stats: Where to record statistics, defaults to a fresh ReviewGateStats
+
+        Raises:
+            ValueError: If the mode is unknown
+        """
+        if mode not in GATE_MODES:
+            raise ValueError(f"Unknown review gate mode {mode!r}, expected one of {GATE_MODES}")
+        self.mode = mode
+        self.accept_threshold = accept_threshold
+        self.patch_threshold = patch_threshold
+        self.judge_model_id = judge_model_id
+        self.judge_max_tokens = judge_max_tokens
+        self.stats = stats or ReviewGateStats()
+
+    @property
+    def uses_judge(self) -> bool:
+        """Whether scoring costs a model call."""
+        return self.mode == "judge"
+
+    async def score(
+        self,
+        query: str,
+        response: str,
+        limits: Optional[AgentRunLimits] = None,
+        usage: Optional[RunUsage] = None
+    ) -> float:
+        """Score the first agent's response.
+
+        Args:
+            query: The query the response answers
+            response: The first agent's response
+            limits: Optional limits applied to the judge run
+            usage: Optional usage object the judge run's usage is added to
+
+        Returns:
+            A score between 0 and 1
+        """
+        if not self.uses_judge:
+            return score_response(query, response)
+
+        judge = create_heroku_agent(
+            name="review_judge",
+            use_registry_tools=False,
+            system_prompt=A2A_JUDGE_SYSTEM_PROMPT,
+            model_id=self.judge_model_id,
+            model_settings={"max_tokens": self.judge_max_tokens, "temperature": 0.0},
+        )
+        prompt = render_dynamic_prompt([
+            ("Topic", query),
+            ("Response", response),
+        ])
+        result = await run_agent(judge, prompt, limits, usage)
+        score = parse_judge_score(str(result.output))
+        # Fall back to the local score when the judge does not answer with a grade
+        return score if score is not None else score_response(query, response)
+
+    def decide(self, score: float) -> str:
+        """Map a score to a gate decision.
+
+        Args:
+            score: The score of the first response
+
+        Returns:
+            ACCEPT, PATCH or REVIEW
+        """
+        if self.mode == "off":
+            return REVIEW
+        if score >= self.accept_threshold:
+            return ACCEPT
+        if score >= self.patch_threshold:
+            return PATCH
+        return REVIEW
+
+    def record(self, query: str, decision: str, score: float, first: str, final: str, started: float) -> None:
+        """Record the outcome of a gated exchange.
+
+        Args:
+            query: The query of the exchange
+            decision: The gate decision
+            score: The gate score of the first response
+            first: The first agent's response
+            final: The response returned to the caller
+            started: time.perf_counter() at the start of the exchange
+        """
+        delta = 0.0
+        if decision != ACCEPT:
+            delta = score_response(query, final) - score_response(query, first)
+        self.stats.record(decision, score, delta, (time.perf_counter() - started) * 1000)
+
+# Create a global review gate instance
+review_gate = ReviewGate()
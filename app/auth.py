@@ -0,0 +1,190 @@
+"""
+API key store with hashed keys and hot reload.
+
+Keys are loaded from a JSON file (API_KEYS_FILE) and/or the legacy single
+API_KEY variable. Only SHA-256 digests are kept in memory, and a presented
+key is hashed before it is looked up, so lookup timing depends on the digest
+rather than on how much of a valid key was guessed. The file looks like:
+
+    {
+        "keys": [
+            {"key_hash": "sha256:<hex digest>", "owner": "acme", "tier": "standard",
+             "limits": {"budget_tokens": 500000}},
+            {"key": "plaintext keys are hashed on load", "owner": "ops", "tier": "admin"}
+        ]
+    }
+
+Generate a digest with ``python -m app.auth <key>``.
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from app.config import (
+    API_KEY,
+    API_KEY_IS_ADMIN,
+    API_KEYS_FILE,
+    API_KEYS_RELOAD_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+ADMIN_TIER = "admin"
+ANONYMOUS_TIER = "anonymous"
+
+@dataclass(frozen=True)
+class Principal:
+    """The caller identified by an API key."""
+    key_id: str
+    owner: str
+    tier: str = "standard"
+    limits: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def is_admin(self) -> bool:
+        """Whether the principal may use administrative endpoints."""
+        return self.tier == ADMIN_TIER
+
+def hash_api_key(api_key: str) -> str:
+    """Hash an API key for storage and lookup.
+
+    Args:
+        api_key: The raw API key
+
+    Returns:
+        The hex SHA-256 digest of the key
+    """
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+
+def anonymous_principal(api_key: Optional[str]) -> Principal:
+    """Build the principal used when no keys are configured.
+
+    Usage is still accounted per presented key, so callers stay distinguishable.
+
+    Args:
+        api_key: The raw API key from the request, if any
+
+    Returns:
+        An anonymous, non-admin principal
+    """
+    key_id = hash_api_key(api_key)[:16] if api_key else "anonymous"
+    return Principal(key_id=key_id, owner="anonymous", tier=ANONYMOUS_TIER)
+
+class APIKeyStore:
+    """Holds hashed API keys with metadata and resolves requests to principals."""
+
+    def __init__(
+        self,
+        keys_file: Optional[str] = API_KEYS_FILE,
+        legacy_key: Optional[str] = API_KEY,
+        legacy_key_is_admin: bool = API_KEY_IS_ADMIN,
+        reload_interval: float = API_KEYS_RELOAD_SECONDS,
+    ):
+        """Initialize the key store and load the keys.
+
+        Args:
+            keys_file: Optional path to the JSON key file, checked for changes periodically
+            legacy_key: Optional single key from the API_KEY variable, granted the standard tier
+            legacy_key_is_admin: Whether the legacy key gets the admin tier instead
+            reload_interval: Minimum seconds between checks of the key file's modification time
+        """
+        self.keys_file = keys_file or None
+        # Only the digest of the legacy key is kept, like every other key
+        self._legacy_digest = hash_api_key(legacy_key) if legacy_key else None
+        self._legacy_tier = ADMIN_TIER if legacy_key_is_admin else "standard"
+        self.reload_interval = reload_interval
+        self._principals: Dict[str, Principal] = {}
+        self._file_mtime: Optional[float] = None
+        self._next_check = 0.0
+        self.load()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether keys are configured; only without API_KEY and API_KEYS_FILE is the API open."""
+        return bool(self.keys_file or self._legacy_digest)
+
+    def _read_file(self) -> Dict[str, Principal]:
+        with open(self.keys_file, encoding="utf-8") as f:
+            data = json.load(f)
+        principals = {}
+        for entry in data.get("keys", []):
+            if "key_hash" in entry:
+                digest = entry["key_hash"].split(":", 1)[-1].lower()
+            else:
+                digest = hash_api_key(entry["key"])
+            principals[digest] = Principal(
+                key_id=digest[:16],
+                owner=entry.get("owner", "unknown"),
+                tier=entry.get("tier", "standard"),
+                limits=dict(entry.get("limits", {})),
+            )
+        return principals
+
+    def load(self) -> None:
+        """(Re)load the keys.
+
+        A key file that fails to load is logged and the previous keys are kept;
+        without previous keys every request is rejected until the file loads.
+        """
+        principals: Dict[str, Principal] = {}
+        if self._legacy_digest:
+            digest = self._legacy_digest
+            principals[digest] = Principal(key_id=digest[:16], owner="default", tier=self._legacy_tier)
+
+        if self.keys_file:
+            try:
+                self._file_mtime = os.stat(self.keys_file).st_mtime
+                principals.update(self._read_file())
+            except (OSError, ValueError, KeyError) as e:
+                logger.error("Failed to load API keys from %s: %s", self.keys_file, e)
+                if self._principals:
+                    return
+
+        # Swap in the new mapping in one assignment so readers never see a partial load
+        self._principals = principals
+
+    def _maybe_reload(self, now: float) -> None:
+        if not self.keys_file or now < self._next_check:
+            return
+        self._next_check = now + self.reload_interval
+        try:
+            mtime = os.stat(self.keys_file).st_mtime
+        except OSError:
+            return
+        if mtime != self._file_mtime:
+            logger.info("API key file %s changed, reloading", self.keys_file)
+            self.load()
+
+    def resolve(self, api_key: Optional[str]) -> Optional[Principal]:
+        """Resolve a presented API key to a principal.
+
+        Args:
+            api_key: The raw API key from the request, if any
+
+        Returns:
+            The principal, an anonymous principal if no keys are configured,
+            or None if the key is not valid
+        """
+        self._maybe_reload(time.monotonic())
+        if not self.enabled:
+            return anonymous_principal(api_key)
+        # A configured key file that is missing, broken or empty locks the API rather than opening it
+        if not api_key or not self._principals:
+            return None
+
+        # Keys are looked up by digest, so the lookup never compares the presented key itself
+        return self._principals.get(hash_api_key(api_key))
+
+# Create a global API key store instance
+api_key_store = APIKeyStore()
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python -m app.auth <api-key>")
+        sys.exit(1)
+    print(f"sha256:{hash_api_key(sys.argv[1])}")
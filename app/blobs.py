@@ -0,0 +1,264 @@
+"""
+Local content-addressed store for large context documents.
+
+Documents are uploaded once as a raw request body, stored under their SHA-256
+digest and referenced as "sha256:<digest>" in later requests, so large
+contexts are neither JSON-escaped nor re-sent with every request. Uploads
+must be UTF-8 text within the context limit, and the least recently used
+blobs are evicted once the store outgrows its size cap.
+"""
+import asyncio
+import codecs
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.config import BLOB_STORE_PATH, BLOB_MAX_BYTES, BLOB_STORE_MAX_BYTES, MAX_CONTEXT_CHARS
+
+BLOB_REF_PREFIX = "sha256:"
+BLOB_REF_PATTERN = r"^sha256:[0-9a-f]{64}$"
+
+class BlobTooLargeError(Exception):
+    """Raised when a blob exceeds the allowed size."""
+
+    def __init__(self, limit: int, unit: str = "bytes"):
+        """Initialize the error.
+
+        Args:
+            limit: The size limit that was exceeded
+            unit: The unit of the limit
+        """
+        super().__init__(f"Blob exceeds the limit of {limit} {unit}")
+        self.limit = limit
+
+class BlobNotFoundError(Exception):
+    """Raised when a referenced blob does not exist."""
+
+def parse_blob_ref(ref: str) -> str:
+    """Extract the digest from a blob reference.
+
+    Args:
+        ref: A reference of the form "sha256:<hex digest>"
+
+    Returns:
+        The hex digest
+
+    Raises:
+        ValueError: If the reference is malformed
+    """
+    if not re.match(BLOB_REF_PATTERN, ref):
+        raise ValueError(f"Invalid blob reference: {ref!r}")
+    return ref[len(BLOB_REF_PREFIX):]
+
+class BlobStore:
+    """Stores blobs on the local filesystem, addressed by their SHA-256 digest."""
+
+    def __init__(
+        self,
+        root: str = BLOB_STORE_PATH,
+        max_size: int = BLOB_MAX_BYTES,
+        max_chars: int = MAX_CONTEXT_CHARS,
+        max_total_size: int = BLOB_STORE_MAX_BYTES,
+    ):
+        """Initialize the store.
+
+        Args:
+            root: Directory the blobs are stored in
+            max_size: Maximum blob size in bytes
+            max_chars: Maximum blob length in characters of UTF-8 text
+            max_total_size: Size in bytes past which old blobs are evicted; 0 disables the cap
+        """
+        self.root = root
+        self.max_size = max_size
+        self.max_chars = max_chars
+        self.max_total_size = max_total_size
+        self.evictions = 0
+        # Total size of the stored blobs, counted on first use; guarded by the lock
+        self._total_size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def path_for(self, ref: str) -> str:
+        """Get the file path of a blob.
+
+        Args:
+            ref: The blob reference
+
+        Returns:
+            The path the blob is stored at
+
+        Raises:
+            ValueError: If the reference is malformed
+        """
+        digest = parse_blob_ref(ref)
+        return os.path.join(self.root, digest[:2], digest)
+
+    async def put_stream(self, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        """Store a blob from a stream of chunks without holding it in memory.
+
+        The blob is hashed and decoded while it is written to a temporary file,
+        which is then moved into place; storing the same content twice keeps one
+        copy. Blobs /a2a would reject as context are rejected here already.
+
+        Args:
+            chunks: The blob content
+
+        Returns:
+            The blob reference, its size and whether it was newly created
+
+        Raises:
+            BlobTooLargeError: If the stream exceeds the maximum size or length
+            ValueError: If the stream is not UTF-8 text
+        """
+        await asyncio.to_thread(os.makedirs, self.root, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=".upload-")
+        digest = hashlib.sha256()
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        size = 0
+        chars = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_size:
+                        raise BlobTooLargeError(self.max_size)
+                    chars += len(self._decode(decoder, chunk))
+                    if chars > self.max_chars:
+                        raise BlobTooLargeError(self.max_chars, "characters")
+                    digest.update(chunk)
+                    await asyncio.to_thread(f.write, chunk)
+            self._decode(decoder, b"", final=True)
+
+            ref = BLOB_REF_PREFIX + digest.hexdigest()
+            created = await asyncio.to_thread(self._admit, temp_path, self.path_for(ref), size)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+        return {"ref": ref, "size": size, "created": created}
+
+    @staticmethod
+    def _decode(decoder: codecs.IncrementalDecoder, chunk: bytes, final: bool = False) -> str:
+        try:
+            return decoder.decode(chunk, final)
+        except UnicodeDecodeError:
+            raise ValueError("Blob is not UTF-8 text") from None
+
+    def _stored_blobs(self) -> List[Tuple[float, int, str]]:
+        blobs = []
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                blobs.append((stat.st_mtime, stat.st_size, entry.path))
+        return blobs
+
+    def _admit(self, temp_path: str, path: str, size: int) -> bool:
+        """Move an uploaded blob into place, evicting old blobs to stay under the cap.
+
+        Runs in a worker thread. The size total is kept per process, so several
+        processes sharing a directory each hold it to the cap only approximately.
+
+        Args:
+            temp_path: The uploaded temporary file
+            path: The path the blob belongs at
+            size: The blob size in bytes
+
+        Returns:
+            Whether the blob was newly created
+        """
+        with self._lock:
+            if os.path.exists(path):
+                # Uploading existing content counts as a use for eviction
+                os.utime(path)
+                return False
+            if self._total_size is None:
+                self._total_size = sum(blob_size for _, blob_size, _ in self._stored_blobs())
+
+            excess = self._total_size + size - self.max_total_size
+            if self.max_total_size > 0 and excess > 0:
+                for _, blob_size, blob_path in sorted(self._stored_blobs()):
+                    if excess <= 0:
+                        break
+                    try:
+                        os.unlink(blob_path)
+                    except FileNotFoundError:
+                        continue
+                    self._total_size -= blob_size
+                    excess -= blob_size
+                    self.evictions += 1
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+            self._total_size += size
+            return True
+
+    def size(self, ref: str) -> int:
+        """Get the size of a blob.
+
+        Args:
+            ref: The blob reference
+
+        Returns:
+            The size in bytes
+
+        Raises:
+            ValueError: If the reference is malformed
+            BlobNotFoundError: If the blob does not exist
+        """
+        try:
+            return os.path.getsize(self.path_for(ref))
+        except FileNotFoundError:
+            raise BlobNotFoundError(f"Blob {ref} not found") from None
+
+    async def read_text(self, ref: str, max_chars: int) -> str:
+        """Read a blob as UTF-8 text, reading no more than the limit allows.
+
+        Args:
+            ref: The blob reference
+            max_chars: Maximum length of the text in characters
+
+        Returns:
+            The text
+
+        Raises:
+            ValueError: If the reference is malformed or the blob is not UTF-8 text
+            BlobNotFoundError: If the blob does not exist
+            BlobTooLargeError: If the text is longer than max_chars
+        """
+        path = self.path_for(ref)
+        # A UTF-8 character takes at most four bytes, so more bytes than this is always too long
+        max_bytes = max_chars * 4
+
+        def read() -> bytes:
+            with open(path, "rb") as f:
+                data = f.read(max_bytes + 1)
+            # Reading marks the blob as recently used, so it is evicted last
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
+            return data
+
+        try:
+            data = await asyncio.to_thread(read)
+        except FileNotFoundError:
+            raise BlobNotFoundError(f"Blob {ref} not found") from None
+        if len(data) > max_bytes:
+            raise BlobTooLargeError(max_chars, "characters")
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            raise ValueError(f"Blob {ref} is not UTF-8 text") from None
+        if len(text) > max_chars:
+            raise BlobTooLargeError(max_chars, "characters")
+        return text
+
+# Create a global blob store instance
+blob_store = BlobStore()
@@ -13,4 +13,95 @@ MODEL_ID = os.getenv("MODEL_ID", "claude-4-sonnet")
 INFERENCE_URL = os.getenv("INFERENCE_URL", "https://us.inference.heroku.com")
 
 # A2A Protocol settings
-DEFAULT_AGENT_NAME = "heroku_demo_agent"
\ No newline at end of file
+DEFAULT_AGENT_NAME = "heroku_demo_agent"
+
+# Usage accounting settings
+USAGE_DB_PATH = os.getenv("USAGE_DB_PATH", "usage.db")
+USAGE_FLUSH_INTERVAL_SECONDS = float(os.getenv("USAGE_FLUSH_INTERVAL_SECONDS", "30"))
+USAGE_BUDGET_TOKENS = int(os.getenv("USAGE_BUDGET_TOKENS", "0"))
+USAGE_BUDGET_WINDOW_SECONDS = int(os.getenv("USAGE_BUDGET_WINDOW_SECONDS", "86400"))
+# /usage reports are read from SQLite over a bounded period and number of rows
+USAGE_REPORT_MAX_AGE_SECONDS = int(os.getenv("USAGE_REPORT_MAX_AGE_SECONDS", "2592000"))
+USAGE_REPORT_MAX_ROWS = int(os.getenv("USAGE_REPORT_MAX_ROWS", "1000"))
+
+
+# Agent run limits, overridable per route (e.g. A2A_MAX_WALL_TIME_SECONDS)
+def _route_setting(route: str, name: str, default: str) -> str:
+    return os.getenv(f"{route.upper()}_{name}", os.getenv(name, default))
+
+AGENT_RUN_ROUTES = ("query", "a2a", "test")
+ROUTE_RUN_LIMITS = {
+    route: {
+        "max_tool_concurrency": int(_route_setting(route, "MAX_TOOL_CONCURRENCY", "4")),
+        "max_tool_round_trips": int(_route_setting(route, "MAX_TOOL_ROUND_TRIPS", "5")),
+        "max_wall_time": float(_route_setting(route, "MAX_WALL_TIME_SECONDS", "60")),
+        "max_total_tokens": int(_route_setting(route, "MAX_TOTAL_TOKENS", "0")),
+    }
+    for route in AGENT_RUN_ROUTES
+}
+
+# Response encoding settings
+JSON_RESPONSE_ENCODER = os.getenv("JSON_RESPONSE_ENCODER", "auto")
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# API key settings
+API_KEY = os.getenv("API_KEY")
+# The single API_KEY is shared by every client, so it only gets the admin tier on request
+API_KEY_IS_ADMIN = os.getenv("API_KEY_IS_ADMIN", "false").lower() == "true"
+API_KEYS_FILE = os.getenv("API_KEYS_FILE")
+API_KEYS_RELOAD_SECONDS = float(os.getenv("API_KEYS_RELOAD_SECONDS", "5"))
+
+# Runtime and event loop monitoring settings
+# Usage accounting and budgets are held per process, so keep one worker unless scaling dynos
+RUNTIME_WORKERS = int(os.getenv("RUNTIME_WORKERS", "1"))
+RUNTIME_BACKLOG = int(os.getenv("RUNTIME_BACKLOG", "2048"))
+RUNTIME_KEEP_ALIVE_SECONDS = int(os.getenv("RUNTIME_KEEP_ALIVE_SECONDS", "95"))
+LOOP_LAG_SAMPLE_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_SAMPLE_INTERVAL_SECONDS", "0.1"))
+LOOP_LAG_WINDOW_SIZE = int(os.getenv("LOOP_LAG_WINDOW_SIZE", "3000"))
+SLOW_CALLBACK_THRESHOLD_SECONDS = float(os.getenv("SLOW_CALLBACK_THRESHOLD_SECONDS", "0.1"))
+
+# A2A review gate settings
+# "off" always runs the full reviewer (while still scoring, to collect tuning data),
+# "heuristic" scores locally and "judge" asks a small model for a capped score
+A2A_REVIEW_GATE = os.getenv("A2A_REVIEW_GATE", "off")
+A2A_GATE_ACCEPT_THRESHOLD = float(os.getenv("A2A_GATE_ACCEPT_THRESHOLD", "0.8"))
+A2A_GATE_PATCH_THRESHOLD = float(os.getenv("A2A_GATE_PATCH_THRESHOLD", "0.5"))
+A2A_GATE_MIN_WORDS = int(os.getenv("A2A_GATE_MIN_WORDS", "120"))
+A2A_JUDGE_MODEL_ID = os.getenv("A2A_JUDGE_MODEL_ID", MODEL_ID)
+A2A_JUDGE_MAX_TOKENS = int(os.getenv("A2A_JUDGE_MAX_TOKENS", "8"))
+
+# Tool plugin settings
+TOOL_ENTRY_POINT_GROUP = os.getenv("TOOL_ENTRY_POINT_GROUP", "heroku_a2a.tools")
+TOOL_DISCOVER_ENTRY_POINTS = os.getenv("TOOL_DISCOVER_ENTRY_POINTS", "true").lower() == "true"
+
+# Request payload limits; token limits are converted to characters for validation
+PAYLOAD_CHARS_PER_TOKEN = 4
+MAX_QUERY_TOKENS = int(os.getenv("MAX_QUERY_TOKENS", "2000"))
+MAX_CONTEXT_TOKENS = int(os.getenv("MAX_CONTEXT_TOKENS", "16000"))
+MAX_QUERY_CHARS = MAX_QUERY_TOKENS * PAYLOAD_CHARS_PER_TOKEN
+MAX_CONTEXT_CHARS = MAX_CONTEXT_TOKENS * PAYLOAD_CHARS_PER_TOKEN
+# The body limit must admit every request the field limits accept: in JSON a character
+# takes up to 12 bytes (a surrogate pair of \uXXXX escapes), plus room for the rest of the body
+JSON_MAX_BYTES_PER_CHAR = 12
+MIN_REQUEST_BODY_BYTES = (MAX_QUERY_CHARS + MAX_CONTEXT_CHARS) * JSON_MAX_BYTES_PER_CHAR + 16384
+MAX_REQUEST_BODY_BYTES = int(os.getenv("MAX_REQUEST_BODY_BYTES", str(MIN_REQUEST_BODY_BYTES)))
+
+# Blob store settings for context documents uploaded by reference
+# Uploads are held to what /a2a accepts as context: MAX_CONTEXT_CHARS of UTF-8 text,
+# which takes at most four bytes per character. Least recently used blobs are evicted
+# once the store grows past BLOB_STORE_MAX_BYTES (0 disables the cap).
+BLOB_STORE_PATH = os.getenv("BLOB_STORE_PATH", "blobs")
+BLOB_MAX_BYTES = int(os.getenv("BLOB_MAX_BYTES", str(MAX_CONTEXT_CHARS * 4)))
+BLOB_STORE_MAX_BYTES = int(os.getenv("BLOB_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Adaptive concurrency toward Heroku Inference, shared by all agents in the process
+INFERENCE_ADAPTIVE_CONCURRENCY = os.getenv("INFERENCE_ADAPTIVE_CONCURRENCY", "true").lower() == "true"
+INFERENCE_CONCURRENCY_INITIAL = int(os.getenv("INFERENCE_CONCURRENCY_INITIAL", "8"))
+INFERENCE_CONCURRENCY_MIN = int(os.getenv("INFERENCE_CONCURRENCY_MIN", "1"))
+INFERENCE_CONCURRENCY_MAX = int(os.getenv("INFERENCE_CONCURRENCY_MAX", "64"))
+INFERENCE_RTT_TOLERANCE = float(os.getenv("INFERENCE_RTT_TOLERANCE", "1.5"))
+INFERENCE_RTT_WINDOW = int(os.getenv("INFERENCE_RTT_WINDOW", "1000"))
+INFERENCE_QUEUE_TIMEOUT_SECONDS = float(os.getenv("INFERENCE_QUEUE_TIMEOUT_SECONDS", "10"))
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", "256"))
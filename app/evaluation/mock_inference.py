@@ -0,0 +1,172 @@
+"""
+Deterministic mock of the Heroku Inference chat completions API.
+
+Point the app at it for reproducible performance runs without upstream cost:
+
+    python -m app.evaluation.mock_inference --port 8001 --latency-ms 200
+    INFERENCE_URL=http://127.0.0.1:8001 INFERENCE_API_KEY=mock python -m app.runtime
+"""
+import argparse
+import asyncio
+import hashlib
+import time
+from typing import Any, Dict, List, Optional, Set
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+def _content_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return ""
+
+class MockInference:
+    """Deterministic chat completion responses with configurable latency.
+
+    Latency is a fixed base plus a per-output-token cost. System prompts that
+    were seen before are reported as cached prompt tokens, mimicking upstream
+    prefix caching. With a capacity, only that many completions are served at
+    once and the rest queue, so latency rises with load like a saturated upstream.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        ms_per_token: float = 0.0,
+        response_tokens: int = 64,
+        capacity: int = 0,
+    ):
+        """Initialize the mock.
+
+        Args:
+            latency_ms: Fixed latency added to every completion
+            ms_per_token: Additional latency per generated token
+            response_tokens: Approximate length of each answer in tokens
+            capacity: Completions served concurrently; 0 means unlimited
+        """
+        self.latency_ms = latency_ms
+        self.ms_per_token = ms_per_token
+        self.response_tokens = response_tokens
+        self.capacity = capacity
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._seen_prefixes: Set[str] = set()
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def answer(self, messages: List[Dict[str, Any]]) -> str:
+        """Build the deterministic answer for a conversation.
+
+        Args:
+            messages: The chat messages of the request
+
+        Returns:
+            An answer derived from the last user message
+        """
+        user_messages = [_content_text(m.get("content")) for m in messages if m.get("role") == "user"]
+        last = user_messages[-1] if user_messages else ""
+        digest = hashlib.sha256(last.encode("utf-8")).hexdigest()[:12]
+        header = f"Mock answer {digest} for: {last[:200]}\n\n"
+        filler = "This deterministic sentence stands in for model output. "
+        body = (filler * (self.response_tokens * 4 // len(filler) + 1))[: self.response_tokens * 4]
+        return header + body
+
+    async def complete(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Produce an OpenAI-compatible chat completion.
+
+        Args:
+            payload: The chat completion request body
+
+        Returns:
+            The chat completion response body
+        """
+        self.requests += 1
+        messages = payload.get("messages", [])
+        text = self.answer(messages)
+
+        system_text = "".join(
+            _content_text(m.get("content")) for m in messages if m.get("role") == "system"
+        )
+        prompt_tokens = sum(estimate_tokens(_content_text(m.get("content"))) for m in messages)
+        completion_tokens = estimate_tokens(text)
+        cached_tokens = 0
+        if system_text:
+            prefix = hashlib.sha256(system_text.encode("utf-8")).hexdigest()
+            if prefix in self._seen_prefixes:
+                cached_tokens = estimate_tokens(system_text)
+            self._seen_prefixes.add(prefix)
+
+        delay = (self.latency_ms + self.ms_per_token * completion_tokens) / 1000
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.capacity:
+                # Created lazily so the semaphore binds to the serving event loop
+                if self._slots is None:
+                    self._slots = asyncio.Semaphore(self.capacity)
+                async with self._slots:
+                    await asyncio.sleep(delay)
+            elif delay > 0:
+                await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+
+        return {
+            "id": f"chatcmpl-mock-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": cached_tokens},
+            },
+        }
+
+def create_mock_app(mock: Optional[MockInference] = None) -> FastAPI:
+    """Create the mock inference ASGI application.
+
+    Args:
+        mock: The mock behaviour, defaults to an instant MockInference
+
+    Returns:
+        A FastAPI app serving /v1/chat/completions
+    """
+    mock = mock or MockInference()
+    app = FastAPI(title="Mock Heroku Inference")
+    app.state.mock = mock
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        return await mock.complete(await request.json())
+
+    return app
+
+def main() -> None:
+    """Serve the mock inference API."""
+    parser = argparse.ArgumentParser(description="Deterministic mock of the Heroku Inference API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--ms-per-token", type=float, default=0.0)
+    parser.add_argument("--response-tokens", type=int, default=64)
+    parser.add_argument("--capacity", type=int, default=0, help="Concurrent completions, 0 for unlimited")
+    args = parser.parse_args()
+
+    mock = MockInference(args.latency_ms, args.ms_per_token, args.response_tokens, args.capacity)
+    uvicorn.run(create_mock_app(mock), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
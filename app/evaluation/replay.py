@@ -0,0 +1,228 @@
+"""
+Replay a JSONL corpus of queries against /query or /a2a with bounded concurrency.
+
+Each corpus line is a JSON object with a query (and optionally an id, context
+and tools). Results are appended to a JSONL file as they complete, which also
+serves as the checkpoint: rerunning with the same output skips items that
+already succeeded.
+
+    python -m app.evaluation.replay corpus.jsonl --route a2a --concurrency 8
+    python -m app.evaluation.replay corpus.jsonl --url https://your-app.herokuapp.com --api-key ...
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, Optional, Set
+
+import httpx
+
+from app.loop_monitor import percentile
+
+@dataclass
+class ReplayItem:
+    """One query from the corpus."""
+    item_id: str
+    payload: Dict[str, Any]
+
+def read_corpus(
+    path: str,
+    route: str = "query",
+    query_field: str = "query",
+    id_field: str = "id",
+) -> Iterator[ReplayItem]:
+    """Stream the corpus one item at a time.
+
+    Args:
+        path: Path to the JSONL corpus
+        route: "query" or "a2a", which decides the request payload shape
+        query_field: Field holding the query text
+        id_field: Field holding a stable item id; the line number is used when missing
+
+    Yields:
+        The corpus items in file order
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            payload: Dict[str, Any] = {"query": record[query_field]}
+            if route == "a2a":
+                payload["context"] = record.get("context")
+            elif record.get("tools") is not None:
+                payload["tools"] = record["tools"]
+            yield ReplayItem(str(record.get(id_field, line_number)), payload)
+
+def completed_ids(path: str) -> Set[str]:
+    """Read the ids that already succeeded from a results file.
+
+    Args:
+        path: Path to the JSONL results file
+
+    Returns:
+        Ids of items without an error
+    """
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A partial line from an interrupted run
+                continue
+            if result.get("error") is None:
+                done.add(result["id"])
+    return done
+
+async def replay(
+    items: Iterator[ReplayItem],
+    client: httpx.AsyncClient,
+    output_path: str,
+    route: str = "query",
+    concurrency: int = 4,
+) -> Dict[str, Any]:
+    """Replay items against the API and append one result line per item.
+
+    Args:
+        items: The corpus items to replay
+        client: HTTP client pointed at the app, in-process or remote
+        output_path: JSONL file results are appended to
+        route: "query" or "a2a"
+        concurrency: Maximum number of requests in flight
+
+    Returns:
+        A summary with counts, latency percentiles and token totals
+    """
+    skip = completed_ids(output_path)
+    queue: "asyncio.Queue[Optional[ReplayItem]]" = asyncio.Queue(maxsize=concurrency * 2)
+    latencies = []
+    summary: Dict[str, Any] = {"completed": 0, "errors": 0, "skipped": 0, "total_tokens": 0}
+
+    async def produce() -> None:
+        # Feed the workers lazily so the corpus is never fully loaded into memory
+        for item in items:
+            if item.item_id in skip:
+                summary["skipped"] += 1
+                continue
+            await queue.put(item)
+        for _ in range(concurrency):
+            await queue.put(None)
+
+    with open(output_path, "a", encoding="utf-8") as output:
+
+        async def work() -> None:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                result = await replay_one(client, route, item)
+                latencies.append(result["latency_ms"])
+                if result["error"] is None:
+                    summary["completed"] += 1
+                    summary["total_tokens"] += (result["usage"] or {}).get("total_tokens", 0)
+                else:
+                    summary["errors"] += 1
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+
+        await asyncio.gather(produce(), *(work() for _ in range(concurrency)))
+
+    latencies.sort()
+    summary["latency_ms"] = {
+        "p50": round(percentile(latencies, 0.50), 1),
+        "p95": round(percentile(latencies, 0.95), 1),
+        "p99": round(percentile(latencies, 0.99), 1),
+    }
+    return summary
+
+async def replay_one(client: httpx.AsyncClient, route: str, item: ReplayItem) -> Dict[str, Any]:
+    """Send one item and build its result record.
+
+    Args:
+        client: HTTP client pointed at the app
+        route: "query" or "a2a"
+        item: The corpus item
+
+    Returns:
+        The result record with latency, status, usage and output
+    """
+    start = time.perf_counter()
+    error: Optional[str] = None
+    body: Dict[str, Any] = {}
+    status = None
+    try:
+        response = await client.post(f"/{route}", json=item.payload)
+        status = response.status_code
+        body = response.json()
+        if status != 200:
+            error = str(body.get("detail", body))
+    except Exception as e:
+        # Record the failure and keep replaying the rest of the corpus
+        error = f"{type(e).__name__}: {e}"
+    latency_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "id": item.item_id,
+        "route": route,
+        "status": status,
+        "latency_ms": round(latency_ms, 1),
+        "usage": body.get("usage"),
+        "output": body.get("response"),
+        "error": error,
+    }
+
+def create_client(url: Optional[str], api_key: Optional[str], timeout: float) -> httpx.AsyncClient:
+    """Create a client for a remote URL, or for the app in-process when no URL is given.
+
+    Args:
+        url: Base URL of a running app, or None for in-process replay
+        api_key: Optional API key sent as X-API-Key
+        timeout: Request timeout in seconds
+
+    Returns:
+        The HTTP client
+    """
+    headers = {"X-API-Key": api_key} if api_key else {}
+    if url:
+        return httpx.AsyncClient(base_url=url, headers=headers, timeout=timeout)
+
+    from app.main import app
+
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://replay",
+        headers=headers,
+        timeout=timeout,
+    )
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run a replay from parsed command line arguments."""
+    items = read_corpus(args.corpus, args.route, args.query_field, args.id_field)
+    async with create_client(args.url, args.api_key, args.timeout) as client:
+        return await replay(items, client, args.output, args.route, args.concurrency)
+
+def main() -> None:
+    """Command line entry point."""
+    parser = argparse.ArgumentParser(description="Replay a JSONL corpus against the agents")
+    parser.add_argument("corpus", help="JSONL file with one query per line")
+    parser.add_argument("--route", choices=["query", "a2a"], default="query")
+    parser.add_argument("--url", help="Base URL of a running app; replays in-process when omitted")
+    parser.add_argument("--api-key", default=os.getenv("API_KEY"))
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--output", default="replay_results.jsonl")
+    parser.add_argument("--query-field", default="query")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
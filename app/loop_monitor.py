@@ -0,0 +1,156 @@
+"""
+Event loop lag sampling and slow callback detection.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from app.config import (
+    LOOP_LAG_SAMPLE_INTERVAL_SECONDS,
+    LOOP_LAG_WINDOW_SIZE,
+    SLOW_CALLBACK_THRESHOLD_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Get a percentile from already sorted values (nearest rank).
+
+    Args:
+        sorted_values: The values, sorted ascending
+        fraction: The percentile as a fraction, e.g. 0.99
+
+    Returns:
+        The value at the percentile, or 0.0 without values
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class LoopMonitor:
+    """Measures event loop lag and logs the stack of callbacks that block the loop.
+
+    A sampler task sleeps for a fixed interval and records how late it wakes up.
+    A watchdog thread checks the sampler's heartbeat; when the loop has not
+    ticked for longer than the threshold, it logs the loop thread's current
+    stack, which points at the blocking callback.
+    """
+
+    def __init__(
+        self,
+        interval: float = LOOP_LAG_SAMPLE_INTERVAL_SECONDS,
+        window_size: int = LOOP_LAG_WINDOW_SIZE,
+        slow_threshold: float = SLOW_CALLBACK_THRESHOLD_SECONDS,
+    ):
+        """Initialize the monitor.
+
+        Args:
+            interval: Seconds between lag samples
+            window_size: Number of recent samples kept for percentiles
+            slow_threshold: Seconds without a loop tick before a stack is logged
+        """
+        self.interval = interval
+        self.slow_threshold = slow_threshold
+        self._samples: Deque[float] = deque(maxlen=window_size)
+        self._max_lag = 0.0
+        self._slow_callbacks = 0
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._sampler: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def record_lag(self, lag: float) -> None:
+        """Record one lag sample.
+
+        Args:
+            lag: Seconds the loop was late
+        """
+        lag = max(0.0, lag)
+        self._samples.append(lag)
+        if lag > self._max_lag:
+            self._max_lag = lag
+
+    async def _sample(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+            self.record_lag(now - expected)
+
+    def _watch(self) -> None:
+        stalled_since: Optional[float] = None
+        check_interval = max(0.005, min(self.interval, self.slow_threshold) / 2)
+        while not self._stopped.wait(check_interval):
+            # A healthy loop beats every `interval`, so only the excess counts as blocking
+            blocked_for = time.monotonic() - self._last_beat - self.interval
+            if blocked_for < self.slow_threshold:
+                stalled_since = None
+                continue
+            if stalled_since == self._last_beat:
+                continue
+            stalled_since = self._last_beat
+            self._slow_callbacks += 1
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<unavailable>"
+            logger.warning(
+                "Event loop blocked for over %.0fms, loop thread stack:\n%s",
+                blocked_for * 1000,
+                stack,
+            )
+
+    def start(self) -> None:
+        """Start sampling on the running loop and start the watchdog thread."""
+        if self._sampler is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._sampler = asyncio.get_running_loop().create_task(self._sample())
+        if self.slow_threshold > 0:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        """Stop sampling and the watchdog thread."""
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.cancel()
+            try:
+                await self._sampler
+            except asyncio.CancelledError:
+                pass
+            self._sampler = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    def report(self) -> Dict[str, Any]:
+        """Build a report of lag percentiles and slow callbacks.
+
+        Returns:
+            Lag percentiles in milliseconds over the recent window and counters
+        """
+        samples = sorted(self._samples)
+        return {
+            "samples": len(samples),
+            "interval_ms": self.interval * 1000,
+            "lag_ms": {
+                "p50": round(percentile(samples, 0.50) * 1000, 3),
+                "p90": round(percentile(samples, 0.90) * 1000, 3),
+                "p99": round(percentile(samples, 0.99) * 1000, 3),
+                "max": round(self._max_lag * 1000, 3),
+            },
+            "slow_callbacks": self._slow_callbacks,
+            "slow_callback_threshold_ms": self.slow_threshold * 1000,
+        }
+
+# Create a global loop monitor instance
+loop_monitor = LoopMonitor()
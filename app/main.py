@@ -1,60 +1,170 @@
 """
 FastAPI application for serving the Heroku agent via a REST API.
 """
-import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from typing import Dict, List, Any, Optional
 
-from fastapi import FastAPI, HTTPException, Depends, Header
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Depends, Header, Request
+from pydantic import BaseModel, Field, model_validator
+from pydantic_ai.usage import RunUsage
 
-from app.config import INFERENCE_API_KEY
+from app.config import (
+    INFERENCE_API_KEY,
+    MODEL_ID,
+    MAX_QUERY_CHARS,
+    MAX_CONTEXT_CHARS,
+    MAX_REQUEST_BODY_BYTES,
+    MIN_REQUEST_BODY_BYTES,
+    BLOB_MAX_BYTES,
+)
 from app.agents.heroku_agent import create_heroku_agent
 from app.tools.registry import tool_registry
 from app.agents.a2a_communication import demonstrate_a2a_communication
+from app.agents.concurrency import ConcurrencyLimitExceeded, inference_limiter
+from app.agents.limits import (
+    AgentRunLimitExceeded,
+    AgentRunTimeout,
+    get_route_limits,
+    run_agent,
+)
+from app.agents.prompts import prompt_cache_stats
+from app.agents.review_gate import review_gate
+from app.responses import CompressionMiddleware, FastJSONResponse
+from app.auth import Principal, api_key_store
+from app.blobs import BLOB_REF_PATTERN, BlobNotFoundError, BlobTooLargeError, blob_store
+from app.loop_monitor import loop_monitor
+from app.payload_limits import RequestBodyLimitMiddleware
+from app.usage import BudgetExceededError, summarize_usage, usage_tracker
+
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background services."""
+    if 0 < MAX_REQUEST_BODY_BYTES < MIN_REQUEST_BODY_BYTES:
+        logger.warning(
+            "MAX_REQUEST_BODY_BYTES=%d is below the %d bytes a request within the query and "
+            "context limits can take as JSON; such requests will be rejected with 413",
+            MAX_REQUEST_BODY_BYTES, MIN_REQUEST_BODY_BYTES
+        )
+    await usage_tracker.start()
+    loop_monitor.start()
+    try:
+        yield
+    finally:
+        await loop_monitor.stop()
+        await usage_tracker.stop()
 
 app = FastAPI(
     title="Heroku Pydantic AI Demo",
     description="A demonstration of Pydantic AI with Heroku Inference",
     version="0.1.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
+app.add_middleware(CompressionMiddleware)
+# Blob uploads stream to disk, so they get their own, larger limit
+app.add_middleware(RequestBodyLimitMiddleware, path_limits={"/blobs": BLOB_MAX_BYTES})
 
 class QueryRequest(BaseModel):
     """Request model for querying the agent."""
-    query: str
+    query: str = Field(..., max_length=MAX_QUERY_CHARS)
     tools: Optional[List[str]] = None
 
 class QueryResponse(BaseModel):
     """Response model for agent queries."""
     response: str
     tools_used: Optional[List[str]] = None
+    usage: Optional[Dict[str, int]] = None
 
 class A2ARequest(BaseModel):
     """Request model for agent-to-agent communication."""
-    query: str
-    context: Optional[str] = None
+    query: str = Field(..., max_length=MAX_QUERY_CHARS)
+    context: Optional[str] = Field(None, max_length=MAX_CONTEXT_CHARS)
+    context_ref: Optional[str] = Field(None, pattern=BLOB_REF_PATTERN)
+    
+    @model_validator(mode="after")
+    def check_single_context(self) -> "A2ARequest":
+        """Reject requests that give both an inline and a referenced context."""
+        if self.context is not None and self.context_ref is not None:
+            raise ValueError("Provide either context or context_ref, not both")
+        return self
 
 class A2AResponse(BaseModel):
     """Response model for agent-to-agent communication."""
     query: str
     context: Optional[str]
     response: str
+    context_ref: Optional[str] = None
+    usage: Optional[Dict[str, int]] = None
+    judge_usage: Optional[Dict[str, int]] = None
+    review: Optional[Dict[str, Any]] = None
 
-async def verify_api_key(x_api_key: str = Header(None)):
+class ToolRegistration(BaseModel):
+    """Request model for registering a tool at runtime."""
+    name: str
+    target: str
+    version: str = "1"
+    activate: bool = True
+
+async def verify_api_key(x_api_key: str = Header(None)) -> Principal:
     """Verify the API key.
     
     Args:
         x_api_key: The API key from the request header
         
     Returns:
-        True if the API key is valid
+        The principal the API key belongs to
         
     Raises:
         HTTPException: If the API key is invalid
     """
-    expected_key = os.environ.get("API_KEY")
-    if expected_key and expected_key != x_api_key:
+    principal = api_key_store.resolve(x_api_key)
+    if principal is None:
         raise HTTPException(status_code=401, detail="Invalid API key")
-    return True
+    return principal
+
+async def enforce_usage_budget(
+    principal: Principal = Depends(verify_api_key)
+) -> Principal:
+    """Reject the request if the caller's token budget is exhausted.
+    
+    Args:
+        principal: The verified caller
+        
+    Returns:
+        The verified caller
+        
+    Raises:
+        HTTPException: If the key's token budget is exhausted
+    """
+    try:
+        usage_tracker.check_budget(principal.key_id, principal.limits.get("budget_tokens"))
+    except BudgetExceededError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    return principal
+
+async def require_admin(principal: Principal = Depends(verify_api_key)) -> Principal:
+    """Require an admin API key.
+    
+    Args:
+        principal: The verified caller
+        
+    Returns:
+        The verified caller
+        
+    Raises:
+        HTTPException: If the caller is not an admin
+    """
+    if not principal.is_admin:
+        raise HTTPException(status_code=403, detail="Admin API key required")
+    return principal
 
 @app.get("/")
 async def root():
@@ -69,13 +179,14 @@ async def test():
     """Test endpoint to verify API functionality."""
     try:
         # Create a simple agent with no tools
-        agent = create_heroku_agent(tools=[], use_registry_tools=False)
+        limits = get_route_limits("test")
+        agent = create_heroku_agent(tools=[], use_registry_tools=False, limits=limits)
         
         # Set a simple prompt
         prompt = "What is your name?"
         
         # Process the prompt
-        result = await agent.run(prompt)
+        result = await run_agent(agent, prompt, limits)
         
         # Extract the response string from the result
         if hasattr(result, 'output'):
@@ -101,10 +212,114 @@ async def list_tools():
         "tools": tool_registry.get_tool_names()
     }
 
+@app.get("/admin/tools")
+async def describe_tools(_: Principal = Depends(require_admin)):
+    """Describe all registered tools with their versions and state."""
+    return tool_registry.snapshot().describe()
+
+@app.post("/admin/tools", status_code=201)
+async def register_tool(registration: ToolRegistration, _: Principal = Depends(require_admin)):
+    """Register a tool, or a new version of one, by import target.
+    
+    Args:
+        registration: The tool name, import target and version
+        
+    Returns:
+        The registry description after the change
+    """
+    try:
+        # Importing the tool module may block, so validate it off the event loop
+        snapshot = await asyncio.to_thread(
+            tool_registry.register_target,
+            registration.name,
+            registration.target,
+            version=registration.version,
+            activate=registration.activate
+        )
+    except (ImportError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid tool target: {str(e)}")
+    return snapshot.describe()
+
+@app.post("/admin/tools/{name}/versions/{version}/activate")
+async def activate_tool_version(name: str, version: str, _: Principal = Depends(require_admin)):
+    """Make a registered version of a tool the active one."""
+    try:
+        return tool_registry.activate_version(name, version).describe()
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+@app.post("/admin/tools/{name}/disable")
+async def disable_tool(name: str, _: Principal = Depends(require_admin)):
+    """Stop offering a tool to agents."""
+    try:
+        return tool_registry.set_enabled(name, False).describe()
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+@app.post("/admin/tools/{name}/enable")
+async def enable_tool(name: str, _: Principal = Depends(require_admin)):
+    """Offer a disabled tool to agents again."""
+    try:
+        return tool_registry.set_enabled(name, True).describe()
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+
+@app.post("/blobs", status_code=201)
+async def upload_blob(request: Request, _: Principal = Depends(verify_api_key)):
+    """Upload a context document as the raw request body.
+    
+    The body is streamed to disk; reference the returned ref as context_ref in /a2a.
+    
+    Args:
+        request: The upload request
+        
+    Returns:
+        The blob reference and size
+    """
+    try:
+        return await blob_store.put_stream(request.stream())
+    except BlobTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@app.get("/blobs/{ref}")
+async def describe_blob(ref: str, _: Principal = Depends(verify_api_key)):
+    """Check that a blob exists and report its size."""
+    try:
+        return {"ref": ref, "size": blob_store.size(ref)}
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except BlobNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.get("/usage")
+async def get_usage(principal: Principal = Depends(verify_api_key)):
+    """Report token usage aggregated per key, route and model.
+    
+    Admins, and every caller while no keys are configured, see all keys;
+    other callers only see their own usage.
+    """
+    if principal.is_admin or not api_key_store.enabled:
+        report = await usage_tracker.report()
+    else:
+        report = await usage_tracker.report(principal.key_id)
+    report["prompt_cache"] = prompt_cache_stats.report()
+    return report
+
+@app.get("/metrics")
+async def get_metrics(_: Principal = Depends(verify_api_key)):
+    """Report runtime metrics such as event loop lag, inference concurrency and A2A review gate decisions."""
+    return {
+        "event_loop": loop_monitor.report(),
+        "inference_concurrency": inference_limiter.report(),
+        "a2a_review_gate": {"mode": review_gate.mode, **review_gate.stats.report()}
+    }
+
 @app.post("/query", response_model=QueryResponse)
 async def query_agent(
     request: QueryRequest,
-    _: bool = Depends(verify_api_key)
+    principal: Principal = Depends(enforce_usage_budget)
 ):
     """Query the agent.
     
@@ -114,26 +329,23 @@ async def query_agent(
     Returns:
         The agent's response
     """
+    limits = get_route_limits("query")
     try:
-        # Create an agent with the requested tools
-        requested_tools = []
-        if request.tools:
-            for tool_name in request.tools:
-                tool = tool_registry.get_tool_by_name(tool_name)
-                if tool:
-                    requested_tools.append(tool)
-            
-            # Create an agent with only the requested tools
-            agent = create_heroku_agent(
-                tools=requested_tools,
-                use_registry_tools=False
-            )
-        else:
-            # Create an agent with all tools
-            agent = create_heroku_agent()
+        # Look up the requested tools, or all of them, in one registry snapshot;
+        # only those tools are imported, and off the event loop
+        tools = await tool_registry.snapshot().load_tools(request.tools or None)
+        agent = create_heroku_agent(
+            tools=tools,
+            use_registry_tools=False,
+            limits=limits
+        )
         
         # Process the query
-        result = await agent.run(request.query)
+        usage = RunUsage()
+        try:
+            result = await run_agent(agent, request.query, limits, usage)
+        finally:
+            usage_tracker.record(principal.key_id, "query", MODEL_ID, usage)
         
         # Extract the response string from the result
         if hasattr(result, 'output'):
@@ -146,10 +358,19 @@ async def query_agent(
         if hasattr(agent, 'tools'):
             tools_used = [tool.name for tool in agent.tools]
         
-        return QueryResponse(
+        # Return the response class directly to skip FastAPI's re-validation and jsonable_encoder pass
+        return FastJSONResponse(QueryResponse(
             response=response,
-            tools_used=tools_used
-        )
+            tools_used=tools_used,
+            usage=summarize_usage(usage)
+        ))
+    except ConcurrencyLimitExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except AgentRunTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except AgentRunLimitExceeded as e:
+        # A server-side guard stopped the run; the request itself was valid
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -159,7 +380,7 @@ async def query_agent(
 @app.post("/a2a", response_model=A2AResponse)
 async def agent_to_agent(
     request: A2ARequest,
-    _: bool = Depends(verify_api_key)
+    principal: Principal = Depends(enforce_usage_budget)
 ):
     """Demonstrate agent-to-agent communication.
     
@@ -169,11 +390,61 @@ async def agent_to_agent(
     Returns:
         The result of agent-to-agent communication
     """
+    context = request.context
+    if request.context_ref:
+        try:
+            context = await blob_store.read_text(request.context_ref, MAX_CONTEXT_CHARS)
+        except BlobNotFoundError as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except BlobTooLargeError as e:
+            raise HTTPException(status_code=413, detail=f"Referenced context: {str(e)}")
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+    
     try:
+        # Every agent of the exchange gets the tools of this one snapshot, imported off the event loop
+        tools = await tool_registry.snapshot().load_tools()
+        
         # Call the a2a demonstration function
-        result = await demonstrate_a2a_communication(request.query, request.context)
+        usage = RunUsage()
+        # The judge may run on a smaller model, so its tokens are accounted separately
+        judge_usage = RunUsage()
+        result = None
+        try:
+            result = await demonstrate_a2a_communication(
+                request.query,
+                context,
+                usage=usage,
+                limits=get_route_limits("a2a"),
+                judge_usage=judge_usage,
+                tools=tools
+            )
+        finally:
+            # The gate decides how many agents ran; assume the full exchange when it failed
+            judge_runs = 1 if judge_usage.requests else 0
+            runs = result["review"]["agent_runs"] - judge_runs if result else 2
+            usage_tracker.record(principal.key_id, "a2a", MODEL_ID, usage, runs=runs)
+            if judge_runs:
+                usage_tracker.record(
+                    principal.key_id, "a2a", review_gate.judge_model_id, judge_usage, runs=judge_runs
+                )
         
-        return A2AResponse(**result)
+        # The result already has the A2AResponse shape, so encode it without copying into a model
+        # usage is the whole exchange, including the judge, which is also broken out on its own
+        result["usage"] = summarize_usage(usage + judge_usage)
+        result["judge_usage"] = summarize_usage(judge_usage)
+        if request.context_ref:
+            # Echo the reference rather than the referenced document
+            result["context"] = None
+            result["context_ref"] = request.context_ref
+        return FastJSONResponse(result)
+    except ConcurrencyLimitExceeded as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except AgentRunTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except AgentRunLimitExceeded as e:
+        # A server-side guard stopped the run; the request itself was valid
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -0,0 +1,94 @@
+"""
+Request body size limits enforced while the body is read.
+"""
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import MAX_REQUEST_BODY_BYTES
+
+class RequestBodyLimitMiddleware:
+    """Reject request bodies above a size limit with 413 before buffering them.
+
+    A declared Content-Length above the limit is rejected without reading the
+    body. Otherwise, including for chunked uploads, the bytes are counted as
+    they are received and reading stops as soon as the limit is crossed.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_body_size: int = MAX_REQUEST_BODY_BYTES,
+        path_limits: Optional[Dict[str, int]] = None,
+    ):
+        """Initialize the middleware.
+
+        Args:
+            app: The ASGI application to wrap
+            max_body_size: Default limit in bytes; 0 disables the limit
+            path_limits: Limits for path prefixes that differ from the default, e.g. uploads
+        """
+        self.app = app
+        self.max_body_size = max_body_size
+        # Longest prefixes first so the most specific limit wins
+        self.path_limits = sorted((path_limits or {}).items(), key=lambda item: -len(item[0]))
+
+    def limit_for(self, path: str) -> int:
+        """Get the body size limit for a request path.
+
+        Args:
+            path: The request path
+
+        Returns:
+            The limit in bytes, 0 for no limit
+        """
+        for prefix, limit in self.path_limits:
+            if path.startswith(prefix):
+                return limit
+        return self.max_body_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limit_for(scope["path"])
+        if limit <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body exceeds the limit of {limit} bytes"
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside the app's body read, so FastAPI turns it into a 413 response
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        async def tracking_send(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except HTTPException as e:
+            # Apps without FastAPI's exception handling let the error escape
+            if e.status_code != 413 or response_started:
+                raise
+            await JSONResponse({"detail": e.detail}, status_code=413)(scope, receive, send)
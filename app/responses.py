@@ -0,0 +1,228 @@
+"""
+Fast JSON response classes and Accept-Encoding negotiated response compression.
+"""
+import json
+import zlib
+from typing import Any, Dict, List, Optional, Type
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from pydantic_core import to_json
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import (
+    JSON_RESPONSE_ENCODER,
+    COMPRESSION_MINIMUM_SIZE,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_BROTLI_QUALITY,
+)
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+class PydanticJSONResponse(JSONResponse):
+    """JSON response encoded straight to bytes by pydantic-core.
+
+    Pydantic models, dataclasses and plain containers are serialized in a
+    single pass without building an intermediate jsonable structure.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
+
+def _model_default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+class StdlibJSONResponse(JSONResponse):
+    """JSON response encoded by the standard library, falling back to model_dump for Pydantic models."""
+
+    def render(self, content: Any) -> bytes:
+        return json.dumps(
+            content,
+            ensure_ascii=False,
+            allow_nan=False,
+            indent=None,
+            separators=(",", ":"),
+            default=_model_default,
+        ).encode("utf-8")
+
+class FastORJSONResponse(JSONResponse):
+    """JSON response encoded by orjson, falling back to model_dump for Pydantic models."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_model_default)
+
+RESPONSE_CLASSES: Dict[str, Type[JSONResponse]] = {
+    "stdlib": StdlibJSONResponse,
+    "pydantic": PydanticJSONResponse,
+    "orjson": FastORJSONResponse,
+}
+
+def get_response_class(encoder: str = JSON_RESPONSE_ENCODER) -> Type[JSONResponse]:
+    """Select the JSON response class for an encoder name.
+
+    Args:
+        encoder: One of "auto", "orjson", "pydantic" or "stdlib"
+
+    Returns:
+        The response class; "auto" prefers orjson when it is installed
+
+    Raises:
+        ValueError: If the encoder is unknown or orjson is requested but missing
+    """
+    if encoder == "auto":
+        encoder = "orjson" if orjson is not None else "pydantic"
+    if encoder not in RESPONSE_CLASSES:
+        raise ValueError(f"Unknown JSON response encoder: {encoder}")
+    if encoder == "orjson" and orjson is None:
+        raise ValueError("JSON_RESPONSE_ENCODER=orjson requires the orjson package")
+    return RESPONSE_CLASSES[encoder]
+
+# The response class used by all routes
+FastJSONResponse = get_response_class()
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick a content encoding from an Accept-Encoding header.
+
+    Args:
+        accept_encoding: The raw Accept-Encoding header value
+
+    Returns:
+        "br" or "gzip" if the client accepts it (brotli preferred when installed), None otherwise
+    """
+    accepted: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+
+    wildcard = accepted.get("*", 0.0)
+    candidates: List[str] = ["br", "gzip"] if brotli is not None else ["gzip"]
+    for encoding in candidates:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+class _Compressor:
+    """Incremental compressor for one response body."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            chunk = self._brotli.process(data)
+            return chunk + (self._brotli.finish() if final else self._brotli.flush())
+        chunk = self._zlib.compress(data)
+        return chunk + self._zlib.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+class CompressionMiddleware:
+    """Compress responses with brotli or gzip based on Accept-Encoding.
+
+    Bodies below the size threshold, already encoded responses and event
+    streams are sent unchanged. Streaming bodies are compressed chunk by chunk.
+    """
+
+    excluded_content_types = ("text/event-stream",)
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MINIMUM_SIZE,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY,
+    ):
+        """Initialize the middleware.
+
+        Args:
+            app: The ASGI application to wrap
+            minimum_size: Bodies smaller than this many bytes are not compressed
+            gzip_level: zlib compression level for gzip
+            brotli_quality: Quality setting for brotli
+        """
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message: Optional[Message] = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start_message, compressor, passthrough
+            message_type = message["type"]
+
+            if message_type == "http.response.start":
+                # Hold the headers until the first body chunk decides the encoding
+                start_message = message
+                headers = Headers(raw=message["headers"])
+                passthrough = "content-encoding" in headers or headers.get(
+                    "content-type", ""
+                ).startswith(self.excluded_content_types)
+                return
+
+            if message_type != "http.response.body":
+                if start_message is not None:
+                    await send(start_message)
+                    start_message = None
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if start_message is not None:
+                headers = MutableHeaders(raw=start_message["headers"])
+                if passthrough or (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                else:
+                    compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                    headers["Content-Encoding"] = encoding
+                    headers.add_vary_header("Accept-Encoding")
+                    body = compressor.compress(body, final=not more_body)
+                    if more_body:
+                        del headers["Content-Length"]
+                    else:
+                        headers["Content-Length"] = str(len(body))
+                    message = {**message, "body": body}
+                await send(start_message)
+                start_message = None
+                await send(message)
+                return
+
+            if compressor is not None and not passthrough:
+                message = {**message, "body": compressor.compress(body, final=not more_body)}
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,46 @@
+"""
+Production runtime profile for serving the API with uvicorn.
+
+Run with:
+    python -m app.runtime
+"""
+import importlib.util
+import os
+from typing import Any, Dict
+
+import uvicorn
+
+from app.config import RUNTIME_WORKERS, RUNTIME_BACKLOG, RUNTIME_KEEP_ALIVE_SECONDS
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+def runtime_options() -> Dict[str, Any]:
+    """Build the uvicorn options for the production profile.
+
+    uvloop and httptools are selected when they are installed, with the
+    pure-Python asyncio loop and h11 parser as fallbacks.
+
+    Returns:
+        Keyword arguments for uvicorn.run
+    """
+    return {
+        "host": os.getenv("HOST", "0.0.0.0"),
+        "port": int(os.getenv("PORT", "8000")),
+        "loop": "uvloop" if _installed("uvloop") else "asyncio",
+        "http": "httptools" if _installed("httptools") else "h11",
+        "workers": RUNTIME_WORKERS,
+        "backlog": RUNTIME_BACKLOG,
+        # Outlive the router's idle timeout so it never reuses a connection we just closed
+        "timeout_keep_alive": RUNTIME_KEEP_ALIVE_SECONDS,
+        "proxy_headers": True,
+        "forwarded_allow_ips": "*",
+        "access_log": os.getenv("ACCESS_LOG", "true").lower() == "true",
+    }
+
+def main() -> None:
+    """Serve the application with the production profile."""
+    uvicorn.run("app.main:app", **runtime_options())
+
+if __name__ == "__main__":
+    main()
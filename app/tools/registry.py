@@ -1,57 +1,427 @@
 """
 Tool registry for managing available tools.
+
+Tools are registered by import target ("module:attribute") and their modules
+are imported only when a tool is first selected. Besides the built-in tools,
+installed packages can contribute tools through the entry point group in
+TOOL_ENTRY_POINT_GROUP:
+
+    [project.entry-points."heroku_a2a.tools"]
+    weather = "weather_tools:weather_tool"
+
+The registry state is an immutable snapshot. Changes build a new snapshot and
+swap it in with a single assignment, so readers never lock and a request that
+took a snapshot keeps seeing it even while tools are registered or disabled.
+
+Importing a tool can take a while, so requests resolve the tools they select
+with ToolSnapshot.load_tools, which imports any not yet loaded in a worker
+thread. A tool that fails to import is remembered and not retried until it is
+registered again.
 """
-from typing import Dict, List, Any
+import asyncio
+import importlib
+import logging
+import threading
+from importlib import metadata
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
 
 from pydantic_ai.tools import Tool
-from app.tools.calculator import calculator_tool
-from app.tools.search import search_tool
+
+from app.config import TOOL_DISCOVER_ENTRY_POINTS, TOOL_ENTRY_POINT_GROUP
+
+logger = logging.getLogger(__name__)
+
+# Built-in tools, imported lazily like plugins
+BUILTIN_TOOLS = {
+    "calculator": "app.tools.calculator:calculator_tool",
+    "search": "app.tools.search:search_tool",
+}
+
+def load_target(target: str) -> Tool:
+    """Import a tool from its import target.
+
+    Args:
+        target: The import target in "module:attribute" form
+
+    Returns:
+        The tool
+
+    Raises:
+        ValueError: If the target is malformed or does not name a Tool
+        ImportError: If the module cannot be imported
+    """
+    module_name, _, attribute = target.partition(":")
+    if not module_name or not attribute:
+        raise ValueError(f"Tool target {target!r} must have the form 'module:attribute'")
+    tool = getattr(importlib.import_module(module_name), attribute, None)
+    if not isinstance(tool, Tool):
+        raise ValueError(f"Tool target {target!r} does not name a pydantic_ai Tool")
+    return tool
+
+class ToolEntry:
+    """One version of a tool, loaded on first use."""
+
+    def __init__(
+        self,
+        name: str,
+        version: str,
+        source: str,
+        target: Optional[str] = None,
+        tool: Optional[Tool] = None
+    ):
+        """Initialize the entry.
+
+        Args:
+            name: The tool name
+            version: The tool version
+            source: Where the entry came from: "builtin", "entry_point", "admin" or "code"
+            target: The import target, required unless a loaded tool is given
+            tool: An already loaded tool
+        """
+        self.name = name
+        self.version = version
+        self.source = source
+        self.target = target
+        self._tool = tool
+        self._error: Optional[Exception] = None
+        self._load_lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        """Whether the tool has been imported."""
+        return self._tool is not None
+
+    @property
+    def failed(self) -> bool:
+        """Whether importing the tool failed; the entry is not retried."""
+        return self._error is not None
+
+    def load(self) -> Tool:
+        """Import the tool on first use.
+
+        Returns:
+            The tool
+
+        Raises:
+            ValueError: If the target is malformed, names no Tool or a tool of another name
+            ImportError: If the module cannot be imported, now or on an earlier attempt
+        """
+        if self._tool is None:
+            with self._load_lock:
+                if self._error is not None:
+                    raise self._error
+                if self._tool is None:
+                    try:
+                        tool = load_target(self.target)
+                        if tool.name != self.name:
+                            raise ValueError(
+                                f"Tool target {self.target!r} provides {tool.name!r}, not {self.name!r}"
+                            )
+                    except (ImportError, ValueError) as e:
+                        self._error = e
+                        raise
+                    self._tool = tool
+        return self._tool
+
+    def describe(self) -> Dict[str, Any]:
+        """Describe the entry for the admin API."""
+        return {
+            "version": self.version,
+            "source": self.source,
+            "target": self.target,
+            "loaded": self.loaded,
+            "error": str(self._error) if self._error is not None else None,
+        }
+
+class ToolSnapshot:
+    """An immutable view of the registry at one point in time."""
+
+    def __init__(
+        self,
+        versions: Dict[str, Dict[str, ToolEntry]],
+        active: Dict[str, str],
+        disabled: FrozenSet[str],
+        generation: int
+    ):
+        """Initialize the snapshot; the dictionaries must not be modified afterwards.
+
+        Args:
+            versions: Entries by tool name and version
+            active: The active version of each tool
+            disabled: Names of disabled tools
+            generation: Incremented with every change to the registry
+        """
+        self.versions = versions
+        self.active = active
+        self.disabled = disabled
+        self.generation = generation
+
+    def _active_entry(self, name: str) -> Optional[ToolEntry]:
+        if name in self.disabled or name not in self.active:
+            return None
+        return self.versions[name][self.active[name]]
+
+    def get_tool_by_name(self, name: str) -> Optional[Tool]:
+        """Get an enabled tool by its name, importing it on first use.
+
+        Args:
+            name: The name of the tool to retrieve
+
+        Returns:
+            The active version of the tool if found and loadable, None otherwise
+        """
+        entry = self._active_entry(name)
+        if entry is None or entry.failed:
+            return None
+        try:
+            return entry.load()
+        except (ImportError, ValueError) as e:
+            # A broken plugin must not fail requests that do not need it; it is logged once
+            logger.error("Could not load tool %s version %s: %s", name, entry.version, e)
+            return None
+
+    def get_all_tools(self) -> List[Tool]:
+        """Get all enabled tools, importing them on first use.
+
+        Returns:
+            List of all enabled tools that could be loaded
+        """
+        return self.get_tools()
+
+    def get_tool_names(self) -> List[str]:
+        """Get the names of all enabled tools without importing them.
+
+        Returns:
+            List of tool names
+        """
+        return [name for name in self.active if name not in self.disabled]
+
+    def get_tools(self, names: Optional[List[str]] = None) -> List[Tool]:
+        """Get the enabled tools of the given names, importing them on first use.
+
+        Args:
+            names: The tool names, all enabled tools if None
+
+        Returns:
+            The tools that are enabled and could be loaded, in the order of the names
+        """
+        tools = (self.get_tool_by_name(name) for name in (self.get_tool_names() if names is None else names))
+        return [tool for tool in tools if tool is not None]
+
+    async def load_tools(self, names: Optional[List[str]] = None) -> List[Tool]:
+        """Get tools like get_tools, importing any not loaded yet in a worker thread.
+
+        Only the selected tools are imported, and never on the event loop.
+
+        Args:
+            names: The tool names, all enabled tools if None
+
+        Returns:
+            The tools that are enabled and could be loaded, in the order of the names
+        """
+        selected = self.get_tool_names() if names is None else names
+        entries = (self._active_entry(name) for name in selected)
+        if any(entry is not None and not entry.loaded and not entry.failed for entry in entries):
+            return await asyncio.to_thread(self.get_tools, selected)
+        return self.get_tools(selected)
+
+    def describe(self) -> Dict[str, Any]:
+        """Describe every tool, its versions and state for the admin API."""
+        return {
+            "generation": self.generation,
+            "tools": {
+                name: {
+                    "active_version": self.active[name],
+                    "enabled": name not in self.disabled,
+                    "versions": {
+                        version: entry.describe() for version, entry in self.versions[name].items()
+                    },
+                }
+                for name in self.versions
+            },
+        }
 
 class ToolRegistry:
     """Registry for managing available tools."""
-    
-    def __init__(self):
-        """Initialize the tool registry."""
-        self._tools: Dict[str, Tool] = {}
-        
-        # Register built-in tools
-        self.register_tool(calculator_tool)
-        self.register_tool(search_tool)
-    
-    def register_tool(self, tool: Tool) -> None:
+
+    def __init__(self, discover_entry_points: bool = TOOL_DISCOVER_ENTRY_POINTS):
+        """Initialize the tool registry.
+
+        Args:
+            discover_entry_points: Whether to add tools advertised by installed packages
+        """
+        self._write_lock = threading.Lock()
+        self._snapshot = ToolSnapshot({}, {}, frozenset(), 0)
+
+        # Register built-in tools without importing them
+        for name, target in BUILTIN_TOOLS.items():
+            self.register_target(name, target, source="builtin", validate=False)
+
+        if discover_entry_points:
+            self.discover_entry_points()
+
+    def snapshot(self) -> ToolSnapshot:
+        """Get the current snapshot; hold on to it for a consistent view during a request.
+
+        Returns:
+            The current registry snapshot
+        """
+        return self._snapshot
+
+    def _update(self, change: Callable[..., None]) -> ToolSnapshot:
+        # Writers are serialized; readers keep using whichever snapshot they hold
+        with self._write_lock:
+            current = self._snapshot
+            versions = {name: dict(entries) for name, entries in current.versions.items()}
+            active = dict(current.active)
+            disabled = set(current.disabled)
+            change(versions, active, disabled)
+            self._snapshot = ToolSnapshot(versions, active, frozenset(disabled), current.generation + 1)
+            return self._snapshot
+
+    def _add(self, entry: ToolEntry, activate: bool) -> ToolSnapshot:
+        def change(versions, active, disabled):
+            versions.setdefault(entry.name, {})[entry.version] = entry
+            if activate or entry.name not in active:
+                active[entry.name] = entry.version
+        return self._update(change)
+
+    def register_tool(self, tool: Tool, version: str = "1") -> None:
         """Register a tool with the registry.
-        
+
         Args:
             tool: The tool to register
+            version: The version of the tool, which becomes active
+        """
+        self._add(ToolEntry(tool.name, version, source="code", tool=tool), activate=True)
+
+    def register_target(
+        self,
+        name: str,
+        target: str,
+        version: str = "1",
+        source: str = "admin",
+        activate: bool = True,
+        validate: bool = True
+    ) -> ToolSnapshot:
+        """Register a tool by import target.
+
+        Args:
+            name: The tool name
+            target: The import target in "module:attribute" form
+            version: The version of the tool
+            source: Where the registration came from
+            activate: Whether the version becomes active; the first version always does
+            validate: Whether to import the tool now instead of on first use
+
+        Returns:
+            The new snapshot
+
+        Raises:
+            ValueError: If validation finds a malformed target or a mismatched tool
+            ImportError: If validation cannot import the module
         """
-        self._tools[tool.name] = tool
-    
-    def get_tool_by_name(self, name: str) -> Tool:
+        entry = ToolEntry(name, version, source=source, target=target)
+        if validate:
+            entry.load()
+        return self._add(entry, activate)
+
+    def activate_version(self, name: str, version: str) -> ToolSnapshot:
+        """Make a registered version of a tool the active one.
+
+        Args:
+            name: The tool name
+            version: The version to activate
+
+        Returns:
+            The new snapshot
+
+        Raises:
+            KeyError: If the tool or version is not registered
+        """
+        def change(versions, active, disabled):
+            if version not in versions.get(name, {}):
+                raise KeyError(f"Tool {name!r} has no version {version!r}")
+            active[name] = version
+        return self._update(change)
+
+    def set_enabled(self, name: str, enabled: bool) -> ToolSnapshot:
+        """Enable or disable a tool.
+
+        Args:
+            name: The tool name
+            enabled: Whether the tool is offered to agents
+
+        Returns:
+            The new snapshot
+
+        Raises:
+            KeyError: If the tool is not registered
+        """
+        def change(versions, active, disabled):
+            if name not in versions:
+                raise KeyError(f"Tool {name!r} is not registered")
+            if enabled:
+                disabled.discard(name)
+            else:
+                disabled.add(name)
+        return self._update(change)
+
+    def discover_entry_points(self, group: str = TOOL_ENTRY_POINT_GROUP) -> List[str]:
+        """Register the tools advertised by installed packages without importing them.
+
+        Args:
+            group: The entry point group to scan
+
+        Returns:
+            Names of the discovered tools
+        """
+        entry_points = metadata.entry_points()
+        if hasattr(entry_points, "select"):
+            found = entry_points.select(group=group)
+        else:
+            found = entry_points.get(group, [])
+
+        names = []
+        for entry_point in found:
+            dist = getattr(entry_point, "dist", None)
+            version = dist.version if dist is not None else "1"
+            self.register_target(
+                entry_point.name,
+                entry_point.value,
+                version=version,
+                source="entry_point",
+                validate=False
+            )
+            names.append(entry_point.name)
+        return names
+
+    def get_tool_by_name(self, name: str) -> Optional[Tool]:
         """Get a tool by its name.
-        
+
         Args:
             name: The name of the tool to retrieve
-            
+
         Returns:
             The tool if found, None otherwise
         """
-        return self._tools.get(name)
-    
+        return self._snapshot.get_tool_by_name(name)
+
     def get_all_tools(self) -> List[Tool]:
         """Get all registered tools.
-        
+
         Returns:
             List of all registered tools
         """
-        return list(self._tools.values())
-    
+        return self._snapshot.get_all_tools()
+
     def get_tool_names(self) -> List[str]:
         """Get the names of all registered tools.
-        
+
         Returns:
             List of tool names
         """
-        return list(self._tools.keys())
+        return self._snapshot.get_tool_names()
 
 # Create a global tool registry instance
-tool_registry = ToolRegistry()
\ No newline at end of file
+tool_registry = ToolRegistry()
@@ -0,0 +1,401 @@
+"""
+Token usage accounting and per-key budgets.
+
+Only the current budget window's token counts and the usage not yet flushed
+are held in memory. Reports are aggregated from the SQLite store with a
+query bounded in time and rows.
+"""
+import asyncio
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+
+from pydantic_ai.usage import RunUsage
+
+from app.config import (
+    USAGE_DB_PATH,
+    USAGE_FLUSH_INTERVAL_SECONDS,
+    USAGE_BUDGET_TOKENS,
+    USAGE_BUDGET_WINDOW_SECONDS,
+    USAGE_REPORT_MAX_AGE_SECONDS,
+    USAGE_REPORT_MAX_ROWS,
+)
+
+logger = logging.getLogger(__name__)
+
+UsageKey = Tuple[int, str, str, str]
+
+class BudgetExceededError(Exception):
+    """Raised when an API key has exhausted its token budget for the current window."""
+
+    def __init__(self, key_id: str, used: int, limit: int, retry_after: int):
+        self.key_id = key_id
+        self.used = used
+        self.limit = limit
+        self.retry_after = retry_after
+        super().__init__(
+            f"Token budget exhausted for key {key_id}: used {used} of {limit} tokens "
+            f"in the current window, retry in {retry_after}s"
+        )
+
+@dataclass
+class UsageCounters:
+    """Aggregated usage counters for one (window, key, route, model) bucket."""
+    runs: int = 0
+    requests: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    tool_round_trips: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        """Sum of input and output tokens."""
+        return self.input_tokens + self.output_tokens
+
+    def add(self, other: "UsageCounters") -> None:
+        """Add another set of counters into this one in place.
+
+        Args:
+            other: The counters to add
+        """
+        self.runs += other.runs
+        self.requests += other.requests
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.cache_read_tokens += other.cache_read_tokens
+        self.tool_round_trips += other.tool_round_trips
+
+    def to_dict(self) -> Dict[str, int]:
+        """Convert the counters to a JSON-friendly dictionary."""
+        return {
+            "runs": self.runs,
+            "requests": self.requests,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "total_tokens": self.total_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "tool_round_trips": self.tool_round_trips,
+        }
+
+def summarize_usage(usage: RunUsage) -> Dict[str, int]:
+    """Summarize the usage of a request for API responses.
+
+    Args:
+        usage: The accumulated usage of the request's agent runs
+
+    Returns:
+        Token and model request counts
+    """
+    return {
+        "requests": usage.requests,
+        "input_tokens": usage.input_tokens,
+        "output_tokens": usage.output_tokens,
+        "total_tokens": usage.total_tokens,
+        "cache_read_tokens": usage.cache_read_tokens,
+    }
+
+class UsageTracker:
+    """In-memory usage accumulator with periodic flushes to a local SQLite store.
+
+    All mutation happens on the event loop thread without awaiting, so no lock
+    is needed. Flushing swaps the pending buffer for a fresh one and writes the
+    detached buffer from a worker thread.
+    """
+
+    def __init__(
+        self,
+        db_path: str = USAGE_DB_PATH,
+        flush_interval: float = USAGE_FLUSH_INTERVAL_SECONDS,
+        budget_tokens: int = USAGE_BUDGET_TOKENS,
+        budget_window: int = USAGE_BUDGET_WINDOW_SECONDS,
+        report_max_age: int = USAGE_REPORT_MAX_AGE_SECONDS,
+        report_max_rows: int = USAGE_REPORT_MAX_ROWS,
+    ):
+        """Initialize the usage tracker.
+
+        Args:
+            db_path: Path to the SQLite file used to persist usage
+            flush_interval: Seconds between background flushes
+            budget_tokens: Default token budget per key and window (0 disables budgets)
+            budget_window: Length of a budget window in seconds
+            report_max_age: Seconds of history a usage report covers
+            report_max_rows: Maximum number of (key, route, model) rows read for a report
+        """
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.budget_tokens = budget_tokens
+        self.budget_window = max(1, budget_window)
+        self.report_max_age = report_max_age
+        self.report_max_rows = report_max_rows
+        self._pending: Dict[UsageKey, UsageCounters] = {}
+        # The batch being written, so reports taken during a flush still count it
+        self._flushing: Dict[UsageKey, UsageCounters] = {}
+        self._window_tokens: Dict[str, Tuple[int, int]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._loaded = False
+
+    def _window_start(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        return int(now // self.budget_window) * self.budget_window
+
+    def tokens_in_window(self, key_id: str, now: Optional[float] = None) -> int:
+        """Get the tokens consumed by a key in the current budget window.
+
+        Args:
+            key_id: The key identifier
+            now: Optional timestamp, defaults to the current time
+
+        Returns:
+            Number of tokens used in the current window
+        """
+        window_start, tokens = self._window_tokens.get(key_id, (0, 0))
+        if window_start != self._window_start(now):
+            return 0
+        return tokens
+
+    def check_budget(self, key_id: str, limit: Optional[int] = None) -> None:
+        """Reject a request early if the key's budget is exhausted.
+
+        Args:
+            key_id: The key identifier
+            limit: Optional per-key token budget overriding the default
+
+        Raises:
+            BudgetExceededError: If the key has no budget left in this window
+        """
+        limit = self.budget_tokens if limit is None else limit
+        if not limit:
+            return
+        now = time.time()
+        used = self.tokens_in_window(key_id, now)
+        if used >= limit:
+            retry_after = int(self._window_start(now) + self.budget_window - now) + 1
+            raise BudgetExceededError(key_id, used, limit, retry_after)
+
+    def record(
+        self,
+        key_id: str,
+        route: str,
+        model: str,
+        usage: RunUsage,
+        runs: int = 1,
+    ) -> None:
+        """Record the usage of one or more agent runs.
+
+        Args:
+            key_id: The key identifier
+            route: The API route that triggered the runs
+            model: The model that served the runs
+            usage: The accumulated usage of the runs
+            runs: How many agent runs contributed to ``usage``
+        """
+        window_start = self._window_start()
+        bucket = (window_start, key_id, route, model)
+        counters = self._pending.get(bucket)
+        if counters is None:
+            counters = self._pending[bucket] = UsageCounters()
+        counters.runs += runs
+        counters.requests += usage.requests
+        counters.input_tokens += usage.input_tokens
+        counters.output_tokens += usage.output_tokens
+        counters.cache_read_tokens += usage.cache_read_tokens
+        # Each model request beyond the first in a run answers a round of tool calls
+        counters.tool_round_trips += max(0, usage.requests - runs)
+
+        previous_start, tokens = self._window_tokens.get(key_id, (window_start, 0))
+        if previous_start != window_start:
+            tokens = 0
+        self._window_tokens[key_id] = (window_start, tokens + usage.total_tokens)
+
+    async def report(self, key_id: Optional[str] = None) -> Dict[str, Any]:
+        """Build a usage report grouped by key, route and model.
+
+        Covers the last report_max_age seconds and at most report_max_rows
+        (key, route, model) rows from the store, plus usage not flushed yet.
+
+        Args:
+            key_id: Optionally restrict the report to one key
+
+        Returns:
+            A dictionary with totals and per-key breakdowns
+        """
+        since = self._window_start(time.time() - self.report_max_age)
+        # One row more than allowed tells whether the report was cut short
+        stored = await asyncio.to_thread(self._read_report, since, key_id, self.report_max_rows + 1)
+        truncated = len(stored) > self.report_max_rows
+        stored = dict(list(stored.items())[:self.report_max_rows])
+
+        rows: Dict[Tuple[str, str, str], UsageCounters] = {}
+        for (bucket_key, route, model), counters in stored.items():
+            rows.setdefault((bucket_key, route, model), UsageCounters()).add(counters)
+        for buckets in (self._flushing, self._pending):
+            for (window_start, bucket_key, route, model), counters in buckets.items():
+                if window_start < since or (key_id is not None and bucket_key != key_id):
+                    continue
+                rows.setdefault((bucket_key, route, model), UsageCounters()).add(counters)
+
+        totals = UsageCounters()
+        keys: Dict[str, Dict[str, Any]] = {}
+        for (bucket_key, route, model), counters in rows.items():
+            entry = keys.setdefault(bucket_key, {"routes": {}, "models": {}})
+            entry["routes"].setdefault(route, UsageCounters()).add(counters)
+            entry["models"].setdefault(model, UsageCounters()).add(counters)
+            totals.add(counters)
+
+        return {
+            "since": since,
+            "truncated": truncated,
+            "totals": totals.to_dict(),
+            "budget": {
+                "tokens": self.budget_tokens,
+                "window_seconds": self.budget_window,
+            },
+            "keys": {
+                bucket_key: {
+                    "tokens_in_window": self.tokens_in_window(bucket_key),
+                    "routes": {name: c.to_dict() for name, c in entry["routes"].items()},
+                    "models": {name: c.to_dict() for name, c in entry["models"].items()},
+                }
+                for bucket_key, entry in keys.items()
+            },
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path)
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS usage (
+                window_start INTEGER NOT NULL,
+                key_id TEXT NOT NULL,
+                route TEXT NOT NULL,
+                model TEXT NOT NULL,
+                runs INTEGER NOT NULL DEFAULT 0,
+                requests INTEGER NOT NULL DEFAULT 0,
+                input_tokens INTEGER NOT NULL DEFAULT 0,
+                output_tokens INTEGER NOT NULL DEFAULT 0,
+                cache_read_tokens INTEGER NOT NULL DEFAULT 0,
+                tool_round_trips INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (window_start, key_id, route, model)
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS usage_key_window ON usage (key_id, window_start)")
+        return conn
+
+    def _write(self, batch: Dict[UsageKey, UsageCounters]) -> None:
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    """INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (window_start, key_id, route, model) DO UPDATE SET
+                        runs = runs + excluded.runs,
+                        requests = requests + excluded.requests,
+                        input_tokens = input_tokens + excluded.input_tokens,
+                        output_tokens = output_tokens + excluded.output_tokens,
+                        cache_read_tokens = cache_read_tokens + excluded.cache_read_tokens,
+                        tool_round_trips = tool_round_trips + excluded.tool_round_trips""",
+                    [
+                        (
+                            *bucket,
+                            c.runs,
+                            c.requests,
+                            c.input_tokens,
+                            c.output_tokens,
+                            c.cache_read_tokens,
+                            c.tool_round_trips,
+                        )
+                        for bucket, c in batch.items()
+                    ],
+                )
+        finally:
+            conn.close()
+
+    def _read_report(
+        self, since: int, key_id: Optional[str], limit: int
+    ) -> Dict[Tuple[str, str, str], UsageCounters]:
+        query = """SELECT key_id, route, model, SUM(runs), SUM(requests), SUM(input_tokens),
+                SUM(output_tokens), SUM(cache_read_tokens), SUM(tool_round_trips)
+            FROM usage WHERE window_start >= ?"""
+        params: List[Any] = [since]
+        if key_id is not None:
+            query += " AND key_id = ?"
+            params.append(key_id)
+        query += " GROUP BY key_id, route, model ORDER BY key_id, route, model LIMIT ?"
+        params.append(limit)
+        conn = self._connect()
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+        return {tuple(row[:3]): UsageCounters(*row[3:]) for row in rows}
+
+    def _read_window_tokens(self, window_start: int) -> Dict[str, int]:
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                """SELECT key_id, SUM(input_tokens + output_tokens) FROM usage
+                WHERE window_start = ? GROUP BY key_id""",
+                (window_start,),
+            ).fetchall()
+        finally:
+            conn.close()
+        return dict(rows)
+
+    async def load(self) -> None:
+        """Restore the current budget windows from the store."""
+        current = self._window_start()
+        stored = await asyncio.to_thread(self._read_window_tokens, current)
+        for key_id, tokens in stored.items():
+            # Keep usage recorded before the load, which the store does not have yet
+            tokens += self.tokens_in_window(key_id)
+            self._window_tokens[key_id] = (current, tokens)
+        self._loaded = True
+
+    async def flush(self) -> None:
+        """Persist pending usage to the local store."""
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self._flushing = batch
+        try:
+            await asyncio.to_thread(self._write, batch)
+        except Exception:
+            logger.exception("Failed to flush usage, keeping it in memory")
+            for bucket, counters in batch.items():
+                self._pending.setdefault(bucket, UsageCounters()).add(counters)
+        finally:
+            self._flushing = {}
+
+        # Budget counts of keys idle since an earlier window are no longer needed
+        current = self._window_start()
+        self._window_tokens = {
+            key: entry for key, entry in self._window_tokens.items() if entry[0] == current
+        }
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def start(self) -> None:
+        """Load stored usage and start the background flusher."""
+        if not self._loaded:
+            await self.load()
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def stop(self) -> None:
+        """Stop the background flusher and flush remaining usage."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+# Create a global usage tracker instance
+usage_tracker = UsageTracker()
@@ -1,7 +1,8 @@
 """
 Main entry point for the Pydantic Heroku A2A demo application.
 """
-import os
+import asyncio
+
 from dotenv import load_dotenv
 from app.agents.heroku_agent import create_heroku_agent
 from app.tools.registry import tool_registry
@@ -9,7 +10,7 @@ from app.tools.registry import tool_registry
 # Load environment variables
 load_dotenv()
 
-def main():
+async def main():
     """Main function to demonstrate agent capabilities."""
     print("Creating Heroku Agent with tools...")
     agent = create_heroku_agent()
@@ -18,22 +19,22 @@ def main():
     
     # Example usage
     print("\nExample 1: Basic query")
-    response = agent.run(
+    response = await agent.run(
         "What is the capital of France and what's the weather like there today?"
     )
-    print(f"Response: {response}")
+    print(f"Response: {response.output}")
     
     print("\nExample 2: Calculator tool usage")
-    response = agent.run(
+    response = await agent.run(
         "Can you calculate the square root of 256 plus 42?"
     )
-    print(f"Response: {response}")
+    print(f"Response: {response.output}")
     
     print("\nExample 3: Search tool usage")
-    response = agent.run(
+    response = await agent.run(
         "Find me some information about the A2A protocol"
     )
-    print(f"Response: {response}")
+    print(f"Response: {response.output}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    asyncio.run(main())
\ No newline at end of file
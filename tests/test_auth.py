@@ -0,0 +1,152 @@
+"""
+Tests for the API key store and request authentication.
+"""
+import json
+import os
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from pydantic_ai import Agent
+from pydantic_ai.models.test import TestModel
+
+from app.auth import APIKeyStore, hash_api_key
+from app.main import app
+from app.usage import UsageTracker
+
+def write_keys(path, keys) -> None:
+    """Write a key file."""
+    path.write_text(json.dumps({"keys": keys}))
+
+class TestAPIKeyStore:
+    """Tests for the API key store."""
+
+    def test_resolve_hashed_and_plaintext_keys(self, tmp_path):
+        """Test that keys given as digests or plaintext both resolve with their metadata."""
+        keys_file = tmp_path / "keys.json"
+        write_keys(keys_file, [
+            {"key_hash": f"sha256:{hash_api_key('tenant-key')}", "owner": "acme",
+             "limits": {"budget_tokens": 10}},
+            {"key": "ops-key", "owner": "ops", "tier": "admin"},
+        ])
+        store = APIKeyStore(keys_file=str(keys_file), legacy_key=None)
+
+        tenant = store.resolve("tenant-key")
+        assert tenant.owner == "acme"
+        assert tenant.limits == {"budget_tokens": 10}
+        assert not tenant.is_admin
+        assert store.resolve("ops-key").is_admin
+        assert store.resolve("wrong-key") is None
+        assert store.resolve(None) is None
+
+    def test_legacy_key_is_standard_unless_opted_in(self):
+        """Test that the single API_KEY remains valid and is only an admin on request."""
+        store = APIKeyStore(keys_file=None, legacy_key="legacy", legacy_key_is_admin=False)
+        assert store.resolve("legacy").tier == "standard"
+        assert store.resolve("other") is None
+
+        store = APIKeyStore(keys_file=None, legacy_key="legacy", legacy_key_is_admin=True)
+        assert store.resolve("legacy").is_admin
+
+    def test_open_without_keys(self):
+        """Test that requests are allowed as anonymous principals when no keys exist."""
+        store = APIKeyStore(keys_file=None, legacy_key=None)
+        assert not store.enabled
+        principal = store.resolve("anything")
+        assert principal.key_id == hash_api_key("anything")[:16]
+        assert not principal.is_admin
+
+    def test_hot_reload(self, tmp_path):
+        """Test that key file changes are picked up without a restart."""
+        keys_file = tmp_path / "keys.json"
+        write_keys(keys_file, [{"key": "first", "owner": "a"}])
+        store = APIKeyStore(keys_file=str(keys_file), legacy_key=None, reload_interval=0)
+        assert store.resolve("first") is not None
+
+        write_keys(keys_file, [{"key": "second", "owner": "b"}])
+        stat = os.stat(keys_file)
+        os.utime(keys_file, (stat.st_atime, stat.st_mtime + 10))
+
+        assert store.resolve("second").owner == "b"
+        assert store.resolve("first") is None
+
+    def test_configured_key_file_fails_closed(self, tmp_path):
+        """Test that a missing, malformed or emptied key file rejects requests instead of opening the API."""
+        missing = APIKeyStore(keys_file=str(tmp_path / "missing.json"), legacy_key=None)
+        assert missing.enabled
+        assert missing.resolve(None) is None
+        assert missing.resolve("anything") is None
+
+        malformed_file = tmp_path / "malformed.json"
+        malformed_file.write_text("{not json")
+        malformed = APIKeyStore(keys_file=str(malformed_file), legacy_key=None)
+        assert malformed.resolve(None) is None
+        assert malformed.resolve("anything") is None
+
+        keys_file = tmp_path / "keys.json"
+        write_keys(keys_file, [{"key": "first", "owner": "a"}])
+        emptied = APIKeyStore(keys_file=str(keys_file), legacy_key=None, reload_interval=0)
+        assert emptied.resolve("first") is not None
+        write_keys(keys_file, [])
+        stat = os.stat(keys_file)
+        os.utime(keys_file, (stat.st_atime, stat.st_mtime + 10))
+        assert emptied.resolve("first") is None
+        assert emptied.resolve(None) is None
+
+    def test_broken_reload_keeps_previous_keys(self, tmp_path):
+        """Test that a malformed key file does not lock everyone out."""
+        keys_file = tmp_path / "keys.json"
+        write_keys(keys_file, [{"key": "first", "owner": "a"}])
+        store = APIKeyStore(keys_file=str(keys_file), legacy_key=None, reload_interval=0)
+
+        keys_file.write_text("{not json")
+        stat = os.stat(keys_file)
+        os.utime(keys_file, (stat.st_atime, stat.st_mtime + 10))
+        assert store.resolve("first") is not None
+
+    def test_no_plaintext_key_is_retained(self, tmp_path):
+        """Test that neither the key table nor the cache keeps a raw key."""
+        keys_file = tmp_path / "keys.json"
+        write_keys(keys_file, [{"key": "tenant-secret", "owner": "a"}])
+        store = APIKeyStore(keys_file=str(keys_file), legacy_key="legacy-secret")
+        for key in ("tenant-secret", "legacy-secret"):
+            assert store.resolve(key) is not None
+            assert store.resolve(key) is not None
+
+        state = repr(vars(store))
+        assert "tenant-secret" not in state
+        assert "legacy-secret" not in state
+
+class TestAuthenticatedRoutes:
+    """Tests for per-tenant keys in the API routes."""
+
+    def test_per_key_budget_and_usage_visibility(self, tmp_path):
+        """Test that key metadata sets budgets and non-admins only see their own usage."""
+        keys_file = tmp_path / "keys.json"
+        write_keys(keys_file, [
+            {"key": "tenant-a", "owner": "a", "limits": {"budget_tokens": 1}},
+            {"key": "tenant-b", "owner": "b"},
+            {"key": "admin", "owner": "ops", "tier": "admin"},
+        ])
+        store = APIKeyStore(keys_file=str(keys_file), legacy_key=None)
+        tracker = UsageTracker(db_path=str(tmp_path / "usage.db"))
+        agent = Agent(TestModel(call_tools=[]))
+
+        with patch("app.main.api_key_store", store), \
+                patch("app.main.usage_tracker", tracker), \
+                patch("app.main.create_heroku_agent", return_value=agent):
+            with TestClient(app) as client:
+                assert client.post("/query", json={"query": "hi"}).status_code == 401
+                assert client.post("/query", json={"query": "hi"}, headers={"X-API-Key": "nope"}).status_code == 401
+
+                for key in ("tenant-a", "tenant-b"):
+                    response = client.post("/query", json={"query": "hi"}, headers={"X-API-Key": key})
+                    assert response.status_code == 200
+
+                # tenant-a has a one-token budget, tenant-b uses the unlimited default
+                assert client.post("/query", json={"query": "hi"}, headers={"X-API-Key": "tenant-a"}).status_code == 429
+                assert client.post("/query", json={"query": "hi"}, headers={"X-API-Key": "tenant-b"}).status_code == 200
+
+                own = client.get("/usage", headers={"X-API-Key": "tenant-a"}).json()
+                assert list(own["keys"]) == [hash_api_key("tenant-a")[:16]]
+                everyone = client.get("/usage", headers={"X-API-Key": "admin"}).json()
+                assert len(everyone["keys"]) == 2
@@ -0,0 +1,158 @@
+"""
+Tests for the adaptive concurrency limit on model calls.
+"""
+import asyncio
+
+import pytest
+from pydantic_ai import Agent
+
+from app.agents.concurrency import (
+    AdaptiveConcurrencyLimiter,
+    AdaptiveConcurrencyModel,
+    ConcurrencyLimitExceeded,
+)
+from app.evaluation.mock_inference import MockInference
+from tests.test_evaluation import mock_model
+
+async def hold(limiter: AdaptiveConcurrencyLimiter, seconds: float) -> None:
+    """Hold a slot of the limiter for a while."""
+    async with limiter.slot():
+        await asyncio.sleep(seconds)
+
+class TestAdaptiveConcurrencyLimiter:
+    """Tests for the limiter's queueing and limit updates."""
+
+    @pytest.mark.asyncio
+    async def test_queues_excess_calls_in_order(self):
+        """Test that calls above the limit wait and are served first come, first served."""
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=2, min_limit=2, max_limit=2)
+        order = []
+
+        async def call(i: int) -> None:
+            async with limiter.slot():
+                order.append(i)
+                await asyncio.sleep(0.01)
+
+        tasks = [asyncio.create_task(call(i)) for i in range(6)]
+        await asyncio.sleep(0)
+        assert limiter.in_flight == 2
+        assert limiter.queue_length == 4
+        await asyncio.gather(*tasks)
+
+        assert order == list(range(6))
+        assert limiter.in_flight == 0
+        assert limiter.report()["queued"] == 4
+
+    @pytest.mark.asyncio
+    async def test_queue_deadline_and_capacity(self):
+        """Test that waiting calls time out and a full queue rejects immediately."""
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1, queue_timeout=0.01, max_queue=1)
+        holder = asyncio.create_task(hold(limiter, 0.1))
+        await asyncio.sleep(0)
+
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(ConcurrencyLimitExceeded, match="queue is full"):
+            await limiter.acquire()
+        with pytest.raises(ConcurrencyLimitExceeded, match="within 0.01s"):
+            await waiter
+
+        await holder
+        report = limiter.report()
+        assert (report["rejected"], report["timeouts"], report["in_flight"]) == (1, 1, 0)
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_frees_its_place(self):
+        """Test that a cancelled waiter neither leaks a slot nor blocks the queue."""
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1)
+        holder = asyncio.create_task(hold(limiter, 0.02))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold(limiter, 0))
+        await asyncio.sleep(0)
+
+        waiter.cancel()
+        await holder
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.in_flight == 0
+        assert limiter.queue_length == 0
+
+    def test_limit_follows_rtt_and_errors(self):
+        """Test that rising RTT and failures shrink the limit and flat RTT under load grows it."""
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=10, max_limit=100, tolerance=1.5)
+        limiter._in_flight = 1
+        limiter.release(0.1, in_flight=10)
+        assert limiter.noload_rtt == 0.1
+
+        # Latency holds under load: probe upwards
+        for _ in range(5):
+            limiter._in_flight = 1
+            limiter.release(0.1, in_flight=10)
+        assert limiter.limit > 10
+
+        # The upstream starts queueing: back off
+        grown = limiter.limit
+        for _ in range(20):
+            limiter._in_flight = 1
+            limiter.release(0.5, in_flight=int(limiter.limit))
+        assert limiter.limit < grown * 0.6
+
+        shrunk = limiter.limit
+        limiter._in_flight = 1
+        limiter.release(error=True)
+        assert limiter.limit == pytest.approx(shrunk * 0.9)
+
+    def test_idle_calls_do_not_grow_the_limit(self):
+        """Test that fast calls far below the limit leave it unchanged."""
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=10)
+        for _ in range(10):
+            limiter._in_flight = 1
+            limiter.release(0.05, in_flight=1)
+        assert limiter.limit == 10
+
+    def test_mixed_output_lengths_do_not_shrink_the_limit(self):
+        """Test that long answers next to short turns are not mistaken for congestion."""
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=32, max_limit=32, tolerance=1.5)
+        calls = [(0.4, 20), (4.0, 400), (0.45, 24), (4.2, 430)]
+        for i in range(2000):
+            rtt, tokens = calls[i % len(calls)]
+            limiter._in_flight = 1
+            limiter.release(rtt, in_flight=int(limiter.limit), output_tokens=tokens)
+        assert limiter.limit == 32
+
+        # Every call slowing down at once is congestion, whatever its length
+        for i in range(40):
+            rtt, tokens = calls[i % len(calls)]
+            limiter._in_flight = 1
+            limiter.release(rtt * 3, in_flight=int(limiter.limit), output_tokens=tokens)
+        assert limiter.limit < 16
+
+class TestStepLoad:
+    """Step-load tests against the mock inference server."""
+
+    @pytest.mark.asyncio
+    async def test_limit_converges_under_a_load_step(self):
+        """Test that a load step beyond upstream capacity lowers the limit and queues locally."""
+        mock = MockInference(latency_ms=10, response_tokens=4, capacity=4)
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=16, max_limit=64, queue_timeout=30)
+        agent = Agent(AdaptiveConcurrencyModel(mock_model(mock), limiter))
+
+        async def callers(count: int, calls_each: int) -> None:
+            async def caller() -> None:
+                for _ in range(calls_each):
+                    await agent.run("ping")
+            await asyncio.gather(*(caller() for _ in range(count)))
+
+        # Light load: the no-load RTT is learnt and the limit is left alone
+        await callers(2, 10)
+        assert limiter.limit == 16
+        noload = limiter.noload_rtt
+
+        # Step to 32 concurrent callers against an upstream that serves 4 at a time
+        await callers(32, 10)
+        report = limiter.report()
+        assert report["limit"] < 12
+        assert report["queued"] > 0
+        assert report["timeouts"] == report["rejected"] == report["errors"] == 0
+        assert limiter.noload_rtt <= noload
+        assert mock.requests == 340
@@ -0,0 +1,89 @@
+"""
+Tests for the mock inference server and the replay runner.
+"""
+import json
+from unittest.mock import patch
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+from pydantic_ai import Agent
+from pydantic_ai.models.openai import OpenAIModel
+from pydantic_ai.providers.heroku import HerokuProvider
+
+from app.auth import APIKeyStore
+from app.evaluation.mock_inference import MockInference, create_mock_app
+from app.evaluation.replay import read_corpus, replay
+from app.main import app
+
+def mock_model(mock: MockInference) -> OpenAIModel:
+    """Create a Heroku model that talks to the mock inference app in-process."""
+    client = AsyncOpenAI(
+        api_key="mock",
+        base_url="http://mock-inference/v1",
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=create_mock_app(mock))),
+    )
+    return OpenAIModel("claude-4-sonnet", provider=HerokuProvider(openai_client=client))
+
+def write_corpus(path, count: int) -> None:
+    """Write a small corpus of queries."""
+    with open(path, "w") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": f"item-{i}", "query": f"question number {i}"}) + "\n")
+
+class TestMockInference:
+    """Tests for the mock inference server."""
+
+    @pytest.mark.asyncio
+    async def test_deterministic_answers_and_cached_prefix(self):
+        """Test that answers are deterministic and repeated system prompts count as cached."""
+        mock = MockInference(response_tokens=16)
+        agent = Agent(mock_model(mock), system_prompt="A long static system prompt. " * 20)
+
+        first = await agent.run("What is Heroku?")
+        second = await agent.run("What is Heroku?")
+
+        assert first.output == second.output
+        assert first.output.startswith("Mock answer")
+        assert first.usage().cache_read_tokens == 0
+        assert second.usage().cache_read_tokens > 0
+        assert mock.requests == 2
+
+class TestReplay:
+    """Tests for the replay runner."""
+
+    def test_read_corpus_field_mapping(self, tmp_path):
+        """Test that corpus fields can be remapped and ids default to line numbers."""
+        corpus = tmp_path / "corpus.jsonl"
+        corpus.write_text('{"body": "first"}\n\n{"body": "second", "request_id": "r-2"}\n')
+        items = list(read_corpus(str(corpus), "a2a", query_field="body", id_field="request_id"))
+        assert [item.item_id for item in items] == ["1", "r-2"]
+        assert items[1].payload == {"query": "second", "context": None}
+
+    @pytest.mark.asyncio
+    async def test_replay_in_process_and_resume(self, tmp_path):
+        """Test an in-process replay through /query and that a rerun resumes from the results."""
+        corpus = tmp_path / "corpus.jsonl"
+        output = tmp_path / "results.jsonl"
+        write_corpus(corpus, 5)
+        mock = MockInference(response_tokens=8)
+
+        with patch("app.main.api_key_store", APIKeyStore(keys_file=None, legacy_key=None)), \
+                patch("app.main.create_heroku_agent", side_effect=lambda **_: Agent(mock_model(mock))):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://replay") as client:
+                summary = await replay(read_corpus(str(corpus)), client, str(output), concurrency=3)
+                assert summary["completed"] == 5
+                assert summary["errors"] == 0
+                assert summary["total_tokens"] > 0
+
+                results = [json.loads(line) for line in output.read_text().splitlines()]
+                assert sorted(r["id"] for r in results) == [f"item-{i}" for i in range(5)]
+                assert all(r["output"].startswith("Mock answer") for r in results)
+                assert all(r["usage"]["requests"] == 1 for r in results)
+
+                write_corpus(corpus, 7)
+                summary = await replay(read_corpus(str(corpus)), client, str(output), concurrency=3)
+                assert summary["skipped"] == 5
+                assert summary["completed"] == 2
+        assert mock.requests == 7
@@ -0,0 +1,138 @@
+"""
+Tests for agent run limits and tool concurrency.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart, ToolReturnPart
+from pydantic_ai.models.function import FunctionModel
+from pydantic_ai.tools import Tool
+from pydantic_ai.usage import RunUsage
+
+from app.agents import limits as limits_module
+from app.agents.limits import (
+    AgentRunLimitExceeded,
+    AgentRunLimits,
+    AgentRunTimeout,
+    ToolConcurrencyLimiter,
+    get_route_limits,
+    run_agent,
+)
+from app.auth import APIKeyStore
+from app.main import app
+from app.tools.calculator import calculator_tool
+
+def fan_out_model(tool_name: str, calls: int) -> FunctionModel:
+    """Create a model that issues several tool calls in its first turn, then answers."""
+    def respond(messages, info):
+        if any(isinstance(part, ToolReturnPart) for message in messages for part in message.parts):
+            return ModelResponse(parts=[TextPart("done")])
+        return ModelResponse(parts=[
+            ToolCallPart(tool_name, {"term": f"term-{i}"}, tool_call_id=f"call-{i}")
+            for i in range(calls)
+        ])
+    return FunctionModel(respond)
+
+def looping_model(tool_name: str) -> FunctionModel:
+    """Create a model that never stops calling a tool."""
+    def respond(messages, info):
+        return ModelResponse(parts=[ToolCallPart(tool_name, {"term": "again"})])
+    return FunctionModel(respond)
+
+class TestToolConcurrencyLimiter:
+    """Tests for the tool concurrency limiter."""
+
+    def test_wrapped_tool_keeps_definition(self):
+        """Test that wrapping a tool keeps its name, description and schema."""
+        wrapped = ToolConcurrencyLimiter(2).wrap(calculator_tool)
+        assert wrapped.name == calculator_tool.name
+        assert wrapped.tool_def.parameters_json_schema == calculator_tool.tool_def.parameters_json_schema
+
+    @pytest.mark.asyncio
+    async def test_tool_calls_run_concurrently_up_to_cap(self):
+        """Test that independent tool calls of one turn run in parallel, bounded by the cap."""
+        lock = threading.Lock()
+        state = {"active": 0, "peak": 0}
+
+        def slow_lookup(term: str) -> str:
+            with lock:
+                state["active"] += 1
+                state["peak"] = max(state["peak"], state["active"])
+            time.sleep(0.05)
+            with lock:
+                state["active"] -= 1
+            return term
+
+        tools = ToolConcurrencyLimiter(2).wrap_all([Tool(slow_lookup, name="lookup")])
+        agent = Agent(fan_out_model("lookup", calls=6), tools=tools)
+
+        result = await run_agent(agent, "look these up")
+
+        assert result.output == "done"
+        # Six overlapping calls ran two at a time: never more, and not one by one
+        assert state["peak"] == 2
+
+class TestRunAgent:
+    """Tests for run limit enforcement."""
+
+    @pytest.mark.asyncio
+    async def test_round_trip_limit_stops_runaway_loop(self):
+        """Test that a model looping on tool calls is stopped."""
+        agent = Agent(looping_model("lookup"), tools=[Tool(lambda term: term, name="lookup")])
+        limits = AgentRunLimits(max_tool_round_trips=3)
+
+        usage = RunUsage()
+        with pytest.raises(AgentRunLimitExceeded, match="request_limit"):
+            await run_agent(agent, "loop", limits, usage)
+        assert usage.requests == 4
+
+    @pytest.mark.asyncio
+    async def test_wall_time_limit(self):
+        """Test that a run exceeding its wall time is cancelled."""
+        async def stall(term: str) -> str:
+            await asyncio.sleep(5)
+            return term
+
+        agent = Agent(looping_model("stall"), tools=[Tool(stall, name="stall")])
+        with pytest.raises(AgentRunTimeout):
+            await run_agent(agent, "stall", AgentRunLimits(max_wall_time=0.1))
+
+    @pytest.mark.asyncio
+    async def test_limits_apply_per_run_with_shared_usage(self):
+        """Test that shared usage does not count against the next run's limits."""
+        agent = Agent(fan_out_model("lookup", calls=1), tools=[Tool(lambda term: term, name="lookup")])
+        limits = AgentRunLimits(max_tool_round_trips=1)
+
+        usage = RunUsage()
+        await run_agent(agent, "first", limits, usage)
+        await run_agent(agent, "second", limits, usage)
+        assert usage.requests == 4
+
+    def test_route_limits(self, monkeypatch):
+        """Test that per-route settings are resolved."""
+        monkeypatch.setitem(
+            limits_module.ROUTE_RUN_LIMITS,
+            "a2a",
+            {"max_tool_concurrency": 1, "max_tool_round_trips": 2, "max_wall_time": 5.0, "max_total_tokens": 100},
+        )
+        limits = get_route_limits("a2a")
+        assert limits.max_tool_concurrency == 1
+        assert limits.usage_limits().request_limit == 3
+        assert limits.usage_limits().total_tokens_limit == 100
+        assert get_route_limits("unknown") == AgentRunLimits()
+
+    def test_route_reports_a_stopped_run_as_unavailable(self, monkeypatch):
+        """Test that a run stopped by its limits is a 503, not a client error."""
+        monkeypatch.setitem(limits_module.ROUTE_RUN_LIMITS, "query", {"max_tool_round_trips": 2})
+        agent = Agent(looping_model("lookup"), tools=[Tool(lambda term: term, name="lookup")])
+        with patch("app.main.api_key_store", APIKeyStore(keys_file=None, legacy_key=None)), \
+                patch("app.main.create_heroku_agent", return_value=agent):
+            response = TestClient(app).post("/query", json={"query": "loop"})
+        assert response.status_code == 503
+        assert "request_limit" in response.json()["detail"]
@@ -0,0 +1,72 @@
+"""
+Tests for event loop monitoring and the runtime profile.
+"""
+import asyncio
+import logging
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.loop_monitor import LoopMonitor, percentile
+from app.runtime import runtime_options
+
+def blocking_calculation(seconds: float) -> None:
+    """Block the event loop thread the way a slow sync callback would."""
+    time.sleep(seconds)
+
+class TestLoopMonitor:
+    """Tests for the loop lag sampler and slow callback detector."""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        values = [float(i) for i in range(1, 101)]
+        assert percentile(values, 0.5) == 50.0
+        assert percentile(values, 0.99) == 99.0
+        assert percentile([], 0.99) == 0.0
+
+    @pytest.mark.asyncio
+    async def test_detects_blocked_loop(self, caplog):
+        """Test that blocking the loop shows up as lag and logs the blocking stack."""
+        monitor = LoopMonitor(interval=0.01, window_size=100, slow_threshold=0.05)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.05)
+            with caplog.at_level(logging.WARNING, logger="app.loop_monitor"):
+                blocking_calculation(0.2)
+                await asyncio.sleep(0.05)
+        finally:
+            await monitor.stop()
+
+        report = monitor.report()
+        assert report["samples"] > 0
+        assert report["lag_ms"]["max"] >= 150
+        assert report["slow_callbacks"] >= 1
+        assert "blocking_calculation" in caplog.text
+
+    @pytest.mark.asyncio
+    async def test_idle_loop_has_no_slow_callbacks(self):
+        """Test that an idle loop reports no slow callbacks."""
+        monitor = LoopMonitor(interval=0.01, window_size=100, slow_threshold=0.1)
+        monitor.start()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+        assert monitor.report()["slow_callbacks"] == 0
+
+class TestRuntimeProfile:
+    """Tests for the uvicorn runtime profile."""
+
+    def test_prefers_uvloop_and_httptools(self):
+        """Test that uvloop and httptools are selected when installed."""
+        with patch("app.runtime._installed", return_value=True):
+            options = runtime_options()
+        assert options["loop"] == "uvloop"
+        assert options["http"] == "httptools"
+        assert options["backlog"] > 0
+
+    def test_falls_back_without_extras(self):
+        """Test the pure-Python fallbacks."""
+        with patch("app.runtime._installed", return_value=False):
+            options = runtime_options()
+        assert options["loop"] == "asyncio"
+        assert options["http"] == "h11"
@@ -0,0 +1,186 @@
+"""
+Tests for request payload limits and the context blob store.
+"""
+import hashlib
+import json
+import os
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.auth import APIKeyStore
+from app.blobs import BlobNotFoundError, BlobStore, BlobTooLargeError
+from app.config import MAX_CONTEXT_CHARS, MAX_QUERY_CHARS
+from app.main import app
+from app.payload_limits import RequestBodyLimitMiddleware
+
+def make_client() -> TestClient:
+    """Create a client for a small app behind the body limit middleware."""
+    limited_app = FastAPI()
+    limited_app.add_middleware(RequestBodyLimitMiddleware, max_body_size=100, path_limits={"/upload": 1000})
+
+    @limited_app.post("/echo")
+    async def echo(payload: dict):
+        return payload
+
+    @limited_app.post("/upload")
+    async def upload(request: Request):
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+        return {"size": size}
+
+    return TestClient(limited_app)
+
+async def chunks(*parts: bytes):
+    """Yield the given parts as an async stream."""
+    for part in parts:
+        yield part
+
+class TestRequestBodyLimitMiddleware:
+    """Tests for the body size limit middleware."""
+
+    def test_declared_length_over_limit(self):
+        """Test that a Content-Length above the limit is rejected without reading the body."""
+        response = make_client().post("/echo", json={"text": "x" * 200})
+        assert response.status_code == 413
+        assert "100 bytes" in response.json()["detail"]
+
+    def test_streamed_body_over_limit(self):
+        """Test that a chunked body is cut off once it crosses the limit."""
+        def body():
+            for _ in range(20):
+                yield b"x" * 100
+        response = make_client().post("/upload", content=body())
+        assert response.status_code == 413
+
+    def test_within_limits_and_path_override(self):
+        """Test that bodies within the limit pass and path prefixes get their own limit."""
+        client = make_client()
+        assert client.post("/echo", json={"text": "ok"}).json() == {"text": "ok"}
+        assert client.post("/upload", content=b"x" * 500).json() == {"size": 500}
+
+class TestBlobStore:
+    """Tests for the content-addressed blob store."""
+
+    @pytest.mark.asyncio
+    async def test_put_stream_deduplicates(self, tmp_path):
+        """Test that blobs are addressed by their digest and stored once."""
+        store = BlobStore(root=str(tmp_path))
+        first = await store.put_stream(chunks(b"hello ", b"world"))
+        second = await store.put_stream(chunks(b"hello world"))
+
+        assert first["ref"] == "sha256:" + hashlib.sha256(b"hello world").hexdigest()
+        assert first["created"] and not second["created"]
+        assert store.size(first["ref"]) == 11
+        assert await store.read_text(first["ref"], max_chars=100) == "hello world"
+        assert [p.name for p in tmp_path.iterdir() if p.name.startswith(".upload-")] == []
+
+    @pytest.mark.asyncio
+    async def test_limits_and_errors(self, tmp_path):
+        """Test size limits, unknown blobs and malformed references."""
+        store = BlobStore(root=str(tmp_path), max_size=10)
+        with pytest.raises(BlobTooLargeError):
+            await store.put_stream(chunks(b"x" * 6, b"x" * 6))
+
+        ref = (await store.put_stream(chunks(b"x" * 10)))["ref"]
+        with pytest.raises(BlobTooLargeError):
+            await store.read_text(ref, max_chars=5)
+        with pytest.raises(BlobNotFoundError):
+            await store.read_text("sha256:" + "0" * 64, max_chars=5)
+        with pytest.raises(ValueError):
+            store.size("sha256:../../etc/passwd")
+
+    @pytest.mark.asyncio
+    async def test_upload_is_held_to_the_context_limit(self, tmp_path):
+        """Test that uploads /a2a would reject as context are rejected when stored."""
+        store = BlobStore(root=str(tmp_path), max_size=100, max_chars=5)
+        # Multi-byte characters split across chunks still count once
+        text = "é" * 5
+        encoded = text.encode()
+        ref = (await store.put_stream(chunks(encoded[:3], encoded[3:])))["ref"]
+        assert await store.read_text(ref, max_chars=5) == text
+
+        with pytest.raises(BlobTooLargeError, match="characters"):
+            await store.put_stream(chunks(("é" * 6).encode()))
+        with pytest.raises(ValueError, match="UTF-8"):
+            await store.put_stream(chunks(b"\xff\xfe"))
+        with pytest.raises(ValueError, match="UTF-8"):
+            await store.put_stream(chunks(encoded[:3]))
+        assert sorted(os.listdir(tmp_path)) == [ref[7:9]]
+
+    @pytest.mark.asyncio
+    async def test_least_recently_used_blobs_are_evicted(self, tmp_path):
+        """Test that the store stays under its size cap by evicting the least recently used blobs."""
+        store = BlobStore(root=str(tmp_path), max_total_size=25)
+        first = (await store.put_stream(chunks(b"a" * 10)))["ref"]
+        second = (await store.put_stream(chunks(b"b" * 10)))["ref"]
+        os.utime(store.path_for(first), (1000, 1000))
+        os.utime(store.path_for(second), (2000, 2000))
+        # Reading the older blob makes the other one the least recently used
+        await store.read_text(first, max_chars=100)
+
+        third = (await store.put_stream(chunks(b"c" * 10)))["ref"]
+        assert store.evictions == 1
+        assert store.size(first) == store.size(third) == 10
+        with pytest.raises(BlobNotFoundError):
+            store.size(second)
+
+class TestPayloadEndpoints:
+    """Tests for payload limits and context references in the API routes."""
+
+    def test_query_length_is_validated(self):
+        """Test that an overlong query is rejected before any agent runs."""
+        with patch("app.main.api_key_store", APIKeyStore(keys_file=None, legacy_key=None)), \
+                patch("app.main.create_heroku_agent") as create_agent:
+            response = TestClient(app).post("/query", json={"query": "x" * (MAX_QUERY_CHARS + 1)})
+        assert response.status_code == 422
+        create_agent.assert_not_called()
+
+    def test_largest_valid_request_passes_the_body_limit(self):
+        """Test that a request at the field limits fits the default body limit in its most escaped form."""
+        demonstrate = AsyncMock(return_value={
+            "query": "q",
+            "context": "c",
+            "response": "answer",
+            "review": {"decision": "accept", "score": 1.0, "agent_runs": 1},
+        })
+        # Characters outside the BMP escape to a 12-byte surrogate pair each
+        body = json.dumps({"query": "\U0001F600" * MAX_QUERY_CHARS, "context": "\U0001F600" * MAX_CONTEXT_CHARS})
+        with patch("app.main.api_key_store", APIKeyStore(keys_file=None, legacy_key=None)), \
+                patch("app.main.demonstrate_a2a_communication", demonstrate):
+            response = TestClient(app).post("/a2a", content=body, headers={"Content-Type": "application/json"})
+        assert response.status_code == 200
+        assert len(demonstrate.call_args.args[1]) == MAX_CONTEXT_CHARS
+
+    def test_a2a_with_context_ref(self, tmp_path):
+        """Test uploading a context document and referencing it in /a2a."""
+        demonstrate = AsyncMock(return_value={
+            "query": "q",
+            "context": "a large document",
+            "response": "answer",
+            "review": {"decision": "review", "score": 0.5, "agent_runs": 2},
+        })
+        with patch("app.main.api_key_store", APIKeyStore(keys_file=None, legacy_key=None)), \
+                patch("app.main.blob_store", BlobStore(root=str(tmp_path))), \
+                patch("app.main.demonstrate_a2a_communication", demonstrate):
+            client = TestClient(app)
+            upload = client.post("/blobs", content="a large document".encode())
+            assert upload.status_code == 201
+            ref = upload.json()["ref"]
+            assert client.get(f"/blobs/{ref}").json()["size"] == 16
+
+            response = client.post("/a2a", json={"query": "q", "context_ref": ref})
+            assert response.status_code == 200
+            assert demonstrate.call_args.args[1] == "a large document"
+            assert response.json()["context_ref"] == ref
+            assert response.json()["context"] is None
+
+            assert client.post("/blobs", content=b"\xff\xfe").status_code == 422
+
+            missing = client.post("/a2a", json={"query": "q", "context_ref": "sha256:" + "0" * 64})
+            assert missing.status_code == 404
+            both = client.post("/a2a", json={"query": "q", "context": "c", "context_ref": ref})
+            assert both.status_code == 422
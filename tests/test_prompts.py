@@ -0,0 +1,100 @@
+"""
+Tests for prompt assembly and prefix cache statistics.
+"""
+import pytest
+from unittest.mock import patch
+
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelRequest, ModelResponse, SystemPromptPart, TextPart, UserPromptPart
+from pydantic_ai.models.function import FunctionModel
+from pydantic_ai.usage import RequestUsage
+
+from app.agents.a2a_communication import demonstrate_a2a_communication
+from app.agents.prompts import (
+    A2A_REVIEWER_SYSTEM_PROMPT,
+    PromptCacheModel,
+    PromptCacheStats,
+    ordered_tools,
+    render_dynamic_prompt,
+)
+from app.tools.calculator import calculator_tool
+from app.tools.search import search_tool
+
+def echo_model(requests: list) -> FunctionModel:
+    """Create a model that records every request and answers with a fixed text."""
+    def respond(messages, info):
+        requests.append((messages, info))
+        return ModelResponse(parts=[TextPart("answer")])
+    return FunctionModel(respond)
+
+def system_prompts(messages) -> list:
+    """Extract the system prompt parts of a request."""
+    return [
+        part.content
+        for message in messages
+        if isinstance(message, ModelRequest)
+        for part in message.parts
+        if isinstance(part, SystemPromptPart)
+    ]
+
+class TestPromptAssembly:
+    """Tests for the prompt assembly helpers."""
+
+    def test_ordered_tools(self):
+        """Test that tools are ordered by name regardless of registration order."""
+        assert [t.name for t in ordered_tools([search_tool, calculator_tool])] == ["calculator", "search"]
+
+    def test_render_dynamic_prompt_skips_empty_sections(self):
+        """Test that empty sections are left out of the dynamic prompt."""
+        prompt = render_dynamic_prompt([("Topic", "python"), ("Context", None)])
+        assert prompt == "Topic:\npython"
+
+class TestPromptCacheModel:
+    """Tests for prefix fingerprinting and cache statistics."""
+
+    @pytest.mark.asyncio
+    async def test_prefix_is_stable_across_dynamic_content(self):
+        """Test that requests differing only in user content share one prefix."""
+        stats = PromptCacheStats()
+        model = PromptCacheModel(echo_model([]), stats=stats)
+        agent = Agent(model, system_prompt="static", tools=ordered_tools([search_tool, calculator_tool]))
+        other = Agent(model, system_prompt="static", tools=ordered_tools([calculator_tool, search_tool]))
+
+        await agent.run("first question")
+        await other.run("a completely different question")
+        await Agent(model, system_prompt="different").run("first question")
+
+        prefixes = stats.report()["prefixes"]
+        assert sorted(p["requests"] for p in prefixes.values()) == [1, 2]
+
+    def test_hit_fraction(self):
+        """Test that the hit fraction is reported once cached tokens are returned."""
+        stats = PromptCacheStats()
+        stats.record("abc", RequestUsage(input_tokens=1000))
+        assert stats.report()["hit_fraction"] is None
+
+        stats.record("abc", RequestUsage(input_tokens=1000, cache_read_tokens=800))
+        report = stats.report()
+        assert report["hit_fraction"] == 0.4
+        assert report["prefixes"]["abc"]["cache_read_tokens"] == 800
+
+class TestA2APromptLayout:
+    """Tests for the prompt layout of the A2A reviewer."""
+
+    @pytest.mark.asyncio
+    async def test_reviewer_prefix_excludes_dynamic_content(self):
+        """Test that the reviewer's system prompt is static and the query follows it."""
+        requests = []
+        with patch("app.agents.heroku_agent.INFERENCE_API_KEY", "test-key"), \
+                patch("app.agents.heroku_agent.OpenAIModel", return_value=echo_model(requests)):
+            result = await demonstrate_a2a_communication("quantum computing", "recent work")
+
+        assert result["response"] == "answer"
+        reviewer_messages, reviewer_info = requests[-1]
+        assert system_prompts(reviewer_messages) == [A2A_REVIEWER_SYSTEM_PROMPT]
+        assert [t.name for t in reviewer_info.function_tools] == ["calculator", "search"]
+        user_prompt = next(
+            part.content for part in reviewer_messages[0].parts if isinstance(part, UserPromptPart)
+        )
+        assert user_prompt.startswith("Topic:\nquantum computing")
+        assert "Original response:\nanswer" in user_prompt
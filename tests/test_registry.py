@@ -0,0 +1,189 @@
+"""
+Tests for lazy tool discovery and runtime changes to the tool registry.
+"""
+import asyncio
+from importlib.metadata import EntryPoint
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic_ai import Agent
+from pydantic_ai.models.test import TestModel
+from pydantic_ai.tools import Tool
+
+from app.auth import APIKeyStore
+from app.main import app
+from app.tools.registry import ToolRegistry, load_target
+from app.usage import UsageTracker
+
+def weather(city: str) -> str:
+    """Report the weather in a city."""
+    return f"Sunny in {city}"
+
+# A plugin tool, registered by import target in the tests below
+weather_tool = Tool(weather, name="weather")
+
+def recording_loader(calls: list):
+    """Build a load_target replacement that records whether it ran on an event loop."""
+    def load(target: str) -> Tool:
+        try:
+            asyncio.get_running_loop()
+            calls.append("event loop")
+        except RuntimeError:
+            calls.append("worker thread")
+        return load_target(target)
+    return load
+
+class TestToolRegistry:
+    """Tests for the tool registry."""
+
+    def test_builtin_tools_load_on_first_use(self):
+        """Test that built-in tools are listed without being imported."""
+        registry = ToolRegistry(discover_entry_points=False)
+        snapshot = registry.snapshot()
+        assert registry.get_tool_names() == ["calculator", "search"]
+        assert not snapshot.versions["search"]["1"].loaded
+
+        assert registry.get_tool_by_name("search").name == "search"
+        assert snapshot.versions["search"]["1"].loaded
+        assert not snapshot.versions["calculator"]["1"].loaded
+
+    def test_discover_entry_points(self):
+        """Test that tools advertised by installed packages are registered lazily."""
+        entry_point = EntryPoint(name="weather", value="tests.test_registry:weather_tool", group="heroku_a2a.tools")
+        with patch("app.tools.registry.metadata.entry_points", return_value={"heroku_a2a.tools": [entry_point]}):
+            registry = ToolRegistry()
+
+        assert registry.snapshot().describe()["tools"]["weather"]["versions"]["1"]["source"] == "entry_point"
+        assert registry.get_tool_by_name("weather") is weather_tool
+
+    def test_snapshot_is_isolated_from_changes(self):
+        """Test that a snapshot taken before a change keeps its view."""
+        registry = ToolRegistry(discover_entry_points=False)
+        before = registry.snapshot()
+        registry.set_enabled("search", False)
+        registry.register_target("weather", "tests.test_registry:weather_tool")
+
+        assert before.get_tool_names() == ["calculator", "search"]
+        assert registry.get_tool_names() == ["calculator", "weather"]
+        assert registry.get_tool_by_name("search") is None
+        assert registry.snapshot().generation == before.generation + 2
+
+    def test_versions(self):
+        """Test registering an inactive version and activating it."""
+        registry = ToolRegistry(discover_entry_points=False)
+        registry.register_target("weather", "tests.test_registry:weather_tool", version="1")
+        registry.register_target("weather", "tests.test_registry:weather_tool", version="2", activate=False)
+        assert registry.snapshot().active["weather"] == "1"
+
+        registry.activate_version("weather", "2")
+        assert registry.snapshot().active["weather"] == "2"
+        with pytest.raises(KeyError):
+            registry.activate_version("weather", "3")
+
+    @pytest.mark.asyncio
+    async def test_load_tools_imports_only_selected_tools_in_a_worker_thread(self):
+        """Test that only the selected tools are imported, off the event loop and once."""
+        calls = []
+        registry = ToolRegistry(discover_entry_points=False)
+        registry.register_target("weather", "tests.test_registry:weather_tool", validate=False)
+        snapshot = registry.snapshot()
+
+        with patch("app.tools.registry.load_target", recording_loader(calls)):
+            assert await snapshot.load_tools(["weather", "missing"]) == [weather_tool]
+            assert await snapshot.load_tools(["weather"]) == [weather_tool]
+
+        assert calls == ["worker thread"]
+        assert not snapshot.versions["search"]["1"].loaded
+        assert not snapshot.versions["calculator"]["1"].loaded
+
+    @pytest.mark.asyncio
+    async def test_load_failures_are_remembered(self):
+        """Test that a plugin that fails to import is not retried on every request."""
+        calls = []
+        registry = ToolRegistry(discover_entry_points=False)
+        registry.register_target("broken", "tests.no_such_module:tool", validate=False)
+
+        with patch("app.tools.registry.load_target", recording_loader(calls)):
+            assert await registry.snapshot().load_tools(["broken"]) == []
+            assert await registry.snapshot().load_tools(["broken"]) == []
+
+        assert calls == ["worker thread"]
+        assert "no_such_module" in registry.snapshot().describe()["tools"]["broken"]["versions"]["1"]["error"]
+
+    def test_invalid_targets(self):
+        """Test that validation rejects malformed, missing and mismatched targets."""
+        registry = ToolRegistry(discover_entry_points=False)
+        with pytest.raises(ValueError):
+            registry.register_target("weather", "tests.test_registry")
+        with pytest.raises(ImportError):
+            registry.register_target("weather", "tests.no_such_module:weather_tool")
+        with pytest.raises(ValueError, match="provides 'weather'"):
+            registry.register_target("forecast", "tests.test_registry:weather_tool")
+
+        # Unvalidated broken entries are skipped instead of failing every request
+        registry.register_target("broken", "tests.no_such_module:tool", validate=False)
+        assert [tool.name for tool in registry.get_all_tools()] == ["calculator", "search"]
+
+class TestToolAdminAPI:
+    """Tests for the tool admin endpoints."""
+
+    def test_query_imports_only_the_requested_tools_off_the_event_loop(self, tmp_path):
+        """Test that startup imports nothing and a request imports just the tools it names."""
+        calls = []
+        registry = ToolRegistry(discover_entry_points=False)
+        agent = Agent(TestModel(call_tools=[]))
+        with patch("app.main.api_key_store", APIKeyStore(keys_file=None, legacy_key=None)), \
+                patch("app.main.usage_tracker", UsageTracker(db_path=str(tmp_path / "usage.db"))), \
+                patch("app.main.tool_registry", registry), \
+                patch("app.main.create_heroku_agent", return_value=agent) as create_agent, \
+                patch("app.tools.registry.load_target", recording_loader(calls)):
+            with TestClient(app) as client:
+                assert calls == []
+                registry.register_target("weather", "tests.test_registry:weather_tool", validate=False)
+                response = client.post("/query", json={"query": "hi", "tools": ["weather"]})
+                assert response.status_code == 200
+
+        assert calls == ["worker thread"]
+        assert create_agent.call_args.kwargs["tools"] == [weather_tool]
+        assert create_agent.call_args.kwargs["use_registry_tools"] is False
+
+    def test_admin_can_register_and_disable_tools(self):
+        """Test registering, versioning and disabling a tool through the API."""
+        headers = {"X-API-Key": "admin-key"}
+        with patch("app.main.api_key_store", APIKeyStore(keys_file=None, legacy_key="admin-key", legacy_key_is_admin=True)), \
+                patch("app.main.tool_registry", ToolRegistry(discover_entry_points=False)):
+            client = TestClient(app)
+
+            response = client.post(
+                "/admin/tools",
+                json={"name": "weather", "target": "tests.test_registry:weather_tool"},
+                headers=headers,
+            )
+            assert response.status_code == 201
+            assert response.json()["tools"]["weather"]["versions"]["1"]["loaded"]
+            assert "weather" in client.get("/tools").json()["tools"]
+
+            response = client.post(
+                "/admin/tools",
+                json={"name": "weather", "target": "tests.no_such_module:tool", "version": "2"},
+                headers=headers,
+            )
+            assert response.status_code == 400
+
+            assert client.post("/admin/tools/weather/disable", headers=headers).status_code == 200
+            assert "weather" not in client.get("/tools").json()["tools"]
+            assert client.post("/admin/tools/weather/versions/9/activate", headers=headers).status_code == 404
+            assert client.post("/admin/tools/missing/enable", headers=headers).status_code == 404
+
+    def test_admin_api_requires_admin(self):
+        """Test that non-admin callers cannot change the registry."""
+        with patch("app.main.api_key_store", APIKeyStore(keys_file=None, legacy_key=None)):
+            client = TestClient(app)
+            assert client.get("/admin/tools").status_code == 403
+            assert client.post("/admin/tools/search/disable").status_code == 403
+
+        shared = APIKeyStore(keys_file=None, legacy_key="shared-key", legacy_key_is_admin=False)
+        with patch("app.main.api_key_store", shared):
+            client = TestClient(app)
+            assert client.get("/admin/tools", headers={"X-API-Key": "shared-key"}).status_code == 403
@@ -0,0 +1,129 @@
+"""
+Tests for the fast JSON response classes and response compression.
+"""
+import gzip
+import json
+from unittest.mock import patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from pydantic_ai import Agent
+from pydantic_ai.models.test import TestModel
+
+from app.auth import APIKeyStore
+from app.main import A2AResponse, QueryResponse, app
+from app.responses import (
+    CompressionMiddleware,
+    PydanticJSONResponse,
+    get_response_class,
+    negotiate_encoding,
+)
+
+LARGE_TEXT = "Heroku Inference answer. " * 200
+
+def make_client() -> TestClient:
+    """Create a client for a small app behind the compression middleware."""
+    app = FastAPI(default_response_class=PydanticJSONResponse)
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+    @app.get("/large")
+    async def large():
+        return PydanticJSONResponse(A2AResponse(query="q", context=None, response=LARGE_TEXT))
+
+    @app.get("/small")
+    async def small():
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for _ in range(5):
+                yield LARGE_TEXT.encode()
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    return TestClient(app)
+
+class TestResponseClasses:
+    """Tests for the JSON response classes."""
+
+    @pytest.mark.parametrize("encoder", ["stdlib", "pydantic", "orjson"])
+    def test_encoders_agree(self, encoder):
+        """Test that every encoder produces the same JSON document."""
+        if encoder == "orjson":
+            pytest.importorskip("orjson")
+        response_class = get_response_class(encoder)
+        model = QueryResponse(response="naïve → ok", tools_used=["search"])
+        assert json.loads(response_class(model).body) == model.model_dump()
+
+    @pytest.mark.parametrize("encoder", ["stdlib", "pydantic", "orjson"])
+    def test_query_route_with_each_encoder(self, encoder):
+        """Test that /query returns its response model under every encoder."""
+        if encoder == "orjson":
+            pytest.importorskip("orjson")
+        agent = Agent(TestModel(call_tools=[], custom_output_text="four"))
+        with patch("app.main.FastJSONResponse", get_response_class(encoder)), \
+                patch("app.main.api_key_store", APIKeyStore(keys_file=None, legacy_key=None)), \
+                patch("app.main.create_heroku_agent", return_value=agent):
+            response = TestClient(app).post("/query", json={"query": "What is 2+2?"})
+        assert response.status_code == 200
+        assert response.json()["response"] == "four"
+
+    def test_unknown_encoder(self):
+        """Test that an unknown encoder name is rejected."""
+        with pytest.raises(ValueError, match="Unknown JSON response encoder"):
+            get_response_class("yaml")
+
+class TestCompression:
+    """Tests for Accept-Encoding negotiation and the compression middleware."""
+
+    def test_negotiate_encoding(self):
+        """Test Accept-Encoding parsing with quality values."""
+        assert negotiate_encoding("") is None
+        assert negotiate_encoding("identity") is None
+        assert negotiate_encoding("gzip, deflate") == "gzip"
+        assert negotiate_encoding("br;q=0, gzip;q=0.5") == "gzip"
+        assert negotiate_encoding("gzip;q=0") is None
+
+    def test_negotiate_prefers_brotli(self):
+        """Test that brotli is preferred when installed and accepted."""
+        pytest.importorskip("brotli")
+        assert negotiate_encoding("gzip, br") == "br"
+
+    def test_gzip_large_response(self):
+        """Test that large responses are gzip compressed."""
+        response = make_client().get("/large", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert int(response.headers["content-length"]) < len(LARGE_TEXT)
+        assert response.json()["response"] == LARGE_TEXT
+
+    def test_brotli_large_response(self):
+        """Test that large responses are brotli compressed when requested."""
+        brotli = pytest.importorskip("brotli")
+        client = make_client()
+        with client.stream("GET", "/large", headers={"Accept-Encoding": "br"}) as response:
+            raw = b"".join(response.iter_raw())
+        assert response.headers["content-encoding"] == "br"
+        assert json.loads(brotli.decompress(raw))["response"] == LARGE_TEXT
+
+    def test_small_response_not_compressed(self):
+        """Test that responses below the threshold are sent as is."""
+        response = make_client().get("/small", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in response.headers
+        assert response.json() == {"ok": True}
+
+    def test_identity_when_not_accepted(self):
+        """Test that nothing is compressed without a matching Accept-Encoding."""
+        response = make_client().get("/large", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in response.headers
+
+    def test_streaming_response(self):
+        """Test that streaming bodies are compressed chunk by chunk."""
+        client = make_client()
+        with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+            raw = b"".join(response.iter_raw())
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        assert gzip.decompress(raw) == LARGE_TEXT.encode() * 5
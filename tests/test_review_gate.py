@@ -0,0 +1,209 @@
+"""
+Tests for the gate between the two stages of A2A communication.
+"""
+import pytest
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+from pydantic_ai.messages import ModelRequest, ModelResponse, SystemPromptPart, TextPart
+from pydantic_ai.models.function import FunctionModel
+from pydantic_ai.usage import RunUsage
+
+from app.agents.a2a_communication import demonstrate_a2a_communication
+from app.agents.prompts import A2A_JUDGE_SYSTEM_PROMPT, A2A_PATCH_SYSTEM_PROMPT
+from app.agents.review_gate import (
+    ACCEPT,
+    PATCH,
+    REVIEW,
+    ReviewGate,
+    apply_patch,
+    parse_judge_score,
+    parse_patch,
+    score_response,
+)
+from app.auth import APIKeyStore
+from app.main import app
+from app.tools.registry import ToolRegistry
+
+GOOD_ANSWER = (
+    "# Heroku dynos\n\n"
+    "- Dynos are lightweight Linux containers that run Heroku applications.\n"
+    "- Each dyno type offers a different amount of memory and CPU share.\n\n"
+    "Scaling adds or removes dynos, and the router spreads requests across them."
+)
+
+def scripted_model(replies: dict, requests: list) -> FunctionModel:
+    """Create a model that answers based on the system prompt of each request."""
+    def respond(messages, info):
+        system = next(
+            part.content
+            for message in messages
+            if isinstance(message, ModelRequest)
+            for part in message.parts
+            if isinstance(part, SystemPromptPart)
+        )
+        requests.append((system, info))
+        reply = next((text for prompt, text in replies.items() if prompt == system), replies[None])
+        return ModelResponse(parts=[TextPart(reply)])
+    return FunctionModel(respond)
+
+async def run_a2a(gate: ReviewGate, replies: dict, requests: list):
+    """Run the A2A exchange against a scripted model."""
+    with patch("app.agents.heroku_agent.INFERENCE_API_KEY", "test-key"), \
+            patch("app.agents.heroku_agent.OpenAIModel", return_value=scripted_model(replies, requests)):
+        return await demonstrate_a2a_communication("How do Heroku dynos scale?", gate=gate)
+
+class TestScoring:
+    """Tests for the local scorer and reply parsing."""
+
+    def test_structured_answer_scores_higher_than_hedge(self):
+        """Test that a structured, on-topic answer beats a short hedge."""
+        good = score_response("How do Heroku dynos scale?", GOOD_ANSWER, min_words=40)
+        hedge = score_response("How do Heroku dynos scale?", "I'm not sure, it depends", min_words=40)
+        assert good > 0.8
+        assert hedge < 0.3
+        assert score_response("anything", "   ") == 0.0
+
+    def test_parse_judge_score(self):
+        """Test that judge grades are scaled to 0-1 and missing grades are None."""
+        assert parse_judge_score("8") == 0.8
+        assert parse_judge_score("Score: 10/10") == 1.0
+        assert parse_judge_score("excellent") is None
+
+    def test_parse_and_apply_patch(self):
+        """Test that edit blocks replace matching text, append, and skip misses."""
+        reply = (
+            "<<<<<<< SEARCH\nlightweight Linux containers\n=======\nisolated Linux containers\n>>>>>>> REPLACE\n"
+            "<<<<<<< SEARCH\nnot in the answer\n=======\nignored\n>>>>>>> REPLACE\n"
+            "<<<<<<< SEARCH\n=======\nAutoscaling is available on performance dynos.\n>>>>>>> REPLACE"
+        )
+        patched, applied = apply_patch(GOOD_ANSWER, parse_patch(reply))
+        assert applied == 2
+        assert "isolated Linux containers" in patched
+        assert patched.endswith("them.\n\nAutoscaling is available on performance dynos.")
+        assert parse_patch("NO CHANGES") == []
+
+    def test_decide_thresholds(self):
+        """Test that scores map to decisions and that the off mode always reviews."""
+        gate = ReviewGate(mode="heuristic", accept_threshold=0.8, patch_threshold=0.5)
+        assert gate.decide(0.9) == ACCEPT
+        assert gate.decide(0.6) == PATCH
+        assert gate.decide(0.2) == REVIEW
+        assert ReviewGate(mode="off").decide(1.0) == REVIEW
+        with pytest.raises(ValueError):
+            ReviewGate(mode="sometimes")
+
+class TestGatedA2A:
+    """Tests for the gated A2A exchange."""
+
+    @pytest.mark.asyncio
+    async def test_accept_skips_reviewer(self):
+        """Test that a high-scoring first response is returned without a second run."""
+        gate = ReviewGate(mode="heuristic", accept_threshold=0.5, patch_threshold=0.2)
+        requests = []
+        result = await run_a2a(gate, {None: GOOD_ANSWER}, requests)
+
+        assert len(requests) == 1
+        assert result["response"] == GOOD_ANSWER
+        assert result["review"]["decision"] == ACCEPT
+        assert result["review"]["agent_runs"] == 1
+
+        report = gate.stats.report()
+        assert report["skip_rate"] == 1.0
+        assert report["decisions"][ACCEPT]["mean_quality_delta"] == 0.0
+
+    @pytest.mark.asyncio
+    async def test_patch_applies_reviewer_edits(self):
+        """Test that a middling response gets only the reviewer's edits applied."""
+        gate = ReviewGate(mode="heuristic", accept_threshold=0.99, patch_threshold=0.2)
+        edits = "<<<<<<< SEARCH\n=======\nSee the Heroku dyno scaling docs.\n>>>>>>> REPLACE"
+        requests = []
+        result = await run_a2a(gate, {A2A_PATCH_SYSTEM_PROMPT: edits, None: GOOD_ANSWER}, requests)
+
+        assert [system for system, _ in requests][-1] == A2A_PATCH_SYSTEM_PROMPT
+        assert result["review"]["decision"] == PATCH
+        assert result["response"].startswith(GOOD_ANSWER)
+        assert result["response"].endswith("See the Heroku dyno scaling docs.")
+        assert gate.stats.report()["patch_rate"] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_judge_mode_uses_capped_judge_call(self):
+        """Test that judge mode scores with a capped small-model call."""
+        gate = ReviewGate(mode="judge", accept_threshold=0.8, judge_model_id="small-model", judge_max_tokens=4)
+        requests = []
+        with patch("app.agents.heroku_agent.OpenAIModel") as openai_model:
+            openai_model.return_value = scripted_model({A2A_JUDGE_SYSTEM_PROMPT: "9", None: "draft"}, requests)
+            with patch("app.agents.heroku_agent.INFERENCE_API_KEY", "test-key"):
+                usage, judge_usage = RunUsage(), RunUsage()
+                result = await demonstrate_a2a_communication(
+                    "What is Heroku?", usage=usage, gate=gate, judge_usage=judge_usage
+                )
+
+        assert result["review"] == {"decision": ACCEPT, "score": 0.9, "agent_runs": 2}
+        assert usage.requests == judge_usage.requests == 1
+        assert openai_model.call_args_list[-1].args[0] == "small-model"
+        judge_system, judge_info = requests[-1]
+        assert judge_system == A2A_JUDGE_SYSTEM_PROMPT
+        assert judge_info.function_tools == []
+        assert judge_info.model_settings["max_tokens"] == 4
+
+    @pytest.mark.asyncio
+    async def test_exchange_keeps_one_tool_snapshot(self):
+        """Test that a tool disabled during the exchange stays available to its later agents."""
+        registry = ToolRegistry(discover_entry_points=False)
+        offered = []
+
+        def respond(messages, info):
+            offered.append(sorted(tool.name for tool in info.function_tools))
+            registry.set_enabled("search", False)
+            return ModelResponse(parts=[TextPart("draft")])
+
+        with patch("app.agents.a2a_communication.tool_registry", registry), \
+                patch("app.agents.heroku_agent.INFERENCE_API_KEY", "test-key"), \
+                patch("app.agents.heroku_agent.OpenAIModel", return_value=FunctionModel(respond)):
+            await demonstrate_a2a_communication("What is Heroku?", gate=ReviewGate(mode="off"))
+
+        assert offered == [["calculator", "search"]] * 2
+        assert registry.get_tool_names() == ["calculator"]
+
+    @pytest.mark.asyncio
+    async def test_review_records_quality_delta_by_bucket(self):
+        """Test that full reviews record their quality delta in the first score's bucket."""
+        gate = ReviewGate(mode="off")
+        requests = []
+        result = await run_a2a(gate, {None: "short draft"}, requests)
+
+        assert len(requests) == 2
+        assert result["review"]["decision"] == REVIEW
+        report = gate.stats.report()
+        assert report["skip_rate"] == 0.0
+        (bucket,) = report["score_buckets"].values()
+        assert bucket["reviewed"] == 1
+        assert bucket["mean_quality_delta"] == 0.0
+
+class TestA2AUsageAccounting:
+    """Tests for how the /a2a route records the judge's usage."""
+
+    def test_judge_usage_is_recorded_under_the_judge_model(self):
+        """Test that judge tokens are recorded under the judge model, apart from the agents' usage."""
+        gate = ReviewGate(mode="judge", accept_threshold=0.8, judge_model_id="small-model")
+        tracker = MagicMock()
+        replies = {A2A_JUDGE_SYSTEM_PROMPT: "9", None: "draft"}
+        with patch("app.main.api_key_store", APIKeyStore(keys_file=None, legacy_key=None)), \
+                patch("app.main.usage_tracker", tracker), \
+                patch("app.main.review_gate", gate), \
+                patch("app.agents.a2a_communication.review_gate", gate), \
+                patch("app.agents.heroku_agent.INFERENCE_API_KEY", "test-key"), \
+                patch("app.agents.heroku_agent.OpenAIModel", return_value=scripted_model(replies, [])):
+            response = TestClient(app).post("/a2a", json={"query": "What is Heroku?"})
+
+        assert response.status_code == 200
+        body = response.json()
+        assert (body["usage"]["requests"], body["judge_usage"]["requests"]) == (2, 1)
+        assert body["usage"]["total_tokens"] > body["judge_usage"]["total_tokens"] > 0
+        (agents_call, judge_call) = tracker.record.call_args_list
+        _, route, model, usage = agents_call.args
+        assert (route, usage.requests, agents_call.kwargs["runs"]) == ("a2a", 1, 1)
+        assert model != "small-model"
+        _, route, model, usage = judge_call.args
+        assert (route, model, usage.requests, judge_call.kwargs["runs"]) == ("a2a", "small-model", 1, 1)
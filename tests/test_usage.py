@@ -0,0 +1,120 @@
+"""
+Tests for token usage accounting and per-key budgets.
+"""
+import time
+
+import pytest
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from pydantic_ai import Agent
+from pydantic_ai.models.test import TestModel
+from pydantic_ai.usage import RunUsage
+
+from app.auth import APIKeyStore, hash_api_key
+from app.main import app
+from app.usage import BudgetExceededError, UsageTracker
+
+class TestUsageTracker:
+    """Tests for the usage tracker."""
+
+    @pytest.mark.asyncio
+    async def test_record_aggregates_per_key_route_and_model(self, tmp_path):
+        """Test that usage is aggregated per key, route and model."""
+        tracker = UsageTracker(db_path=str(tmp_path / "usage.db"))
+        tracker.record("key-a", "query", "model-x", RunUsage(requests=3, input_tokens=100, output_tokens=20))
+        tracker.record("key-a", "query", "model-x", RunUsage(requests=1, input_tokens=10, output_tokens=5))
+        tracker.record("key-b", "a2a", "model-x", RunUsage(requests=2, input_tokens=50, output_tokens=50), runs=2)
+
+        report = await tracker.report()
+        assert report["totals"]["runs"] == 4
+        assert report["totals"]["total_tokens"] == 235
+
+        query_usage = report["keys"]["key-a"]["routes"]["query"]
+        assert query_usage["runs"] == 2
+        assert query_usage["input_tokens"] == 110
+        assert query_usage["tool_round_trips"] == 2
+        assert report["keys"]["key-b"]["routes"]["a2a"]["tool_round_trips"] == 0
+        assert report["keys"]["key-b"]["models"]["model-x"]["total_tokens"] == 100
+
+    def test_budget_rejects_when_exhausted(self, tmp_path):
+        """Test that a key is rejected once its window budget is used up."""
+        tracker = UsageTracker(db_path=str(tmp_path / "usage.db"), budget_tokens=100)
+        tracker.check_budget("key-a")
+        tracker.record("key-a", "query", "model-x", RunUsage(requests=1, input_tokens=80, output_tokens=30))
+
+        with pytest.raises(BudgetExceededError, match="Token budget exhausted"):
+            tracker.check_budget("key-a")
+
+        # Other keys and explicit overrides are unaffected
+        tracker.check_budget("key-b")
+        tracker.check_budget("key-a", limit=1000)
+
+    def test_budget_window_resets(self, tmp_path):
+        """Test that budgets only count tokens from the current window."""
+        tracker = UsageTracker(db_path=str(tmp_path / "usage.db"), budget_tokens=100, budget_window=60)
+        tracker.record("key-a", "query", "model-x", RunUsage(requests=1, input_tokens=200))
+
+        window_start = tracker._window_start()
+        assert tracker.tokens_in_window("key-a", now=window_start + 1) == 200
+        assert tracker.tokens_in_window("key-a", now=window_start + 61) == 0
+
+    @pytest.mark.asyncio
+    async def test_flush_and_reload(self, tmp_path):
+        """Test that flushed usage survives a restart and restores budgets."""
+        db_path = str(tmp_path / "usage.db")
+        tracker = UsageTracker(db_path=db_path, budget_tokens=100)
+        tracker.record("key-a", "query", "model-x", RunUsage(requests=1, input_tokens=150))
+        await tracker.flush()
+        tracker.record("key-a", "query", "model-x", RunUsage(requests=1, input_tokens=1))
+        await tracker.flush()
+
+        restored = UsageTracker(db_path=db_path, budget_tokens=100)
+        await restored.load()
+        assert (await restored.report())["totals"]["input_tokens"] == 151
+        with pytest.raises(BudgetExceededError):
+            restored.check_budget("key-a")
+
+    @pytest.mark.asyncio
+    async def test_history_stays_on_disk(self, tmp_path):
+        """Test that flushed usage leaves memory and reports read a bounded history from the store."""
+        db_path = str(tmp_path / "usage.db")
+        tracker = UsageTracker(db_path=db_path, budget_window=60, report_max_age=600, report_max_rows=2)
+        now = time.time()
+        with patch("app.usage.time.time", return_value=now - 3600):
+            tracker.record("key-old", "query", "model-x", RunUsage(requests=1, input_tokens=1000))
+        for key in ("key-a", "key-b", "key-c"):
+            tracker.record(key, "query", "model-x", RunUsage(requests=1, input_tokens=10))
+        await tracker.flush()
+
+        assert tracker._pending == {}
+        assert "key-old" not in tracker._window_tokens
+        report = await tracker.report()
+        # The hour-old window is outside the report, and only two rows are read
+        assert list(report["keys"]) == ["key-a", "key-b"]
+        assert report["truncated"]
+        assert (await tracker.report("key-c"))["totals"]["input_tokens"] == 10
+
+class TestUsageEndpoints:
+    """Tests for usage accounting in the API routes."""
+
+    def test_query_records_usage_and_enforces_budget(self, tmp_path):
+        """Test that /query records usage and is rejected once the budget is spent."""
+        tracker = UsageTracker(db_path=str(tmp_path / "usage.db"), budget_tokens=1)
+        agent = Agent(TestModel(call_tools=[]))
+
+        with patch("app.main.api_key_store", APIKeyStore(keys_file=None, legacy_key=None)), \
+                patch("app.main.usage_tracker", tracker), \
+                patch("app.main.create_heroku_agent", return_value=agent):
+            with TestClient(app) as client:
+                response = client.post("/query", json={"query": "hello"}, headers={"X-API-Key": "secret"})
+                assert response.status_code == 200
+
+                report = client.get("/usage").json()
+                key_report = report["keys"][hash_api_key("secret")[:16]]
+                assert key_report["routes"]["query"]["runs"] == 1
+                assert key_report["tokens_in_window"] > 0
+
+                response = client.post("/query", json={"query": "hello"}, headers={"X-API-Key": "secret"})
+                assert response.status_code == 429
+                assert "Retry-After" in response.headers